@@ -1,4 +1,6 @@
 from django.contrib import admin
-from .models import Dataset
+from .models import Dataset, ProcessingJob, ResultCacheEntry
 
 admin.site.register(Dataset)
+admin.site.register(ProcessingJob)
+admin.site.register(ResultCacheEntry)
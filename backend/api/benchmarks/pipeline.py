@@ -0,0 +1,222 @@
+"""Times every stage of the analysis on synthetic equipment CSVs; run through `manage.py benchmark`.
+
+Each scenario is one generated CSV (rows, numeric columns, Type cardinality, null ratio,
+outlier rate). Stages are timed best-of-`repeat` with their peak resident memory, and
+results can be compared with a stored baseline to catch regressions.
+"""
+import itertools
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from api.utils import PIPELINE_VERSION, pdf_report, process_csv, visualization_csv
+from api.utils.context import AnalysisContext
+
+from .synthetic import equipment_csv
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+PLOT_METHODS = ("pie_chart", "equipment_averages_chart", "boxplots", "corr_matrix")
+
+# rows per preset; the other dimensions default to a single value each
+PRESETS = {
+    "smoke": [10_000],
+    "default": [10_000, 100_000, 1_000_000],
+    "large": [10_000_000, 50_000_000],
+}
+
+
+def scenarios(rows, cols=(3,), types=(5,), null_ratios=(0.02,), outlier_rates=(0.01,)):
+    return [
+        {"rows": r, "cols": c, "types": t, "null_ratio": n, "outlier_rate": o}
+        for r, c, t, n, o in itertools.product(rows, cols, types, null_ratios, outlier_rates)
+    ]
+
+
+def scenario_id(scenario):
+    return ",".join(f"{key}={value}" for key, value in scenario.items())
+
+
+def _rss_mb():
+    # current resident set, Linux only
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+@contextmanager
+def measured(record, interval=0.005):
+    """Adds wall/CPU seconds and the peak RSS while the block ran to `record`.
+
+    The peak is sampled from a thread every `interval` seconds. Without /proc it falls back
+    to the process high-water mark, which never goes down between stages.
+    """
+    peak = [_rss_mb()]
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            peak[0] = max(peak[0], _rss_mb())
+
+    sampler = threading.Thread(target=sample, daemon=True) if peak[0] is not None else None
+    if sampler:
+        sampler.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record["wall"] = time.perf_counter() - wall
+        record["cpu"] = time.process_time() - cpu
+        if sampler:
+            done.set()
+            sampler.join()
+            record["peak_rss_mb"] = round(max(peak[0], _rss_mb()), 1)
+        else:
+            record["peak_rss_mb"] = _max_rss_mb()
+
+
+def best_of(runs):
+    # the fastest run is the least disturbed by the rest of the machine; memory is the worst seen
+    best = dict(min(runs, key=lambda run: run["wall"]))
+    best["wall"] = round(best["wall"], 4)
+    best["cpu"] = round(best["cpu"], 4)
+    peaks = [run["peak_rss_mb"] for run in runs if run.get("peak_rss_mb") is not None]
+    best["peak_rss_mb"] = max(peaks) if peaks else None
+    return best
+
+
+def _stage_runs(csv_path, work_dir, chart_workers, report_profile):
+    stages = {}
+
+    context = AnalysisContext()
+    with measured({}) as record:
+        df, stats = process_csv(csv_path, context=context)
+    stages["process_csv"] = record
+
+    viz = visualization_csv(
+        df,
+        os.path.join(work_dir, "charts"),
+        outlier_counts=stats.get("outliers", {}),
+        equip_dist=stats.get("equip_dist", {}),
+        equip_averages=stats.get("equip_averages", {}),
+        workers=chart_workers,
+        context=context
+    )
+    charts = []
+    for method in PLOT_METHODS:
+        with measured({}) as record:
+            result = getattr(viz, method)()
+        stages[f"CSVPlots.{method}"] = record
+        if result:
+            charts.extend(result if isinstance(result, list) else [result])
+
+    with measured({}) as record:
+        pdf_report(os.path.join(work_dir, "report.pdf"), stats, charts, chart_profile=report_profile)
+    stages["pdf_report"] = record
+
+    return stages
+
+
+def run_scenario(scenario, data_dir, repeat=3, chart_workers=1, report_profile=None, end_to_end=None):
+    """Best-of-`repeat` timings of each stage for one scenario.
+
+    `end_to_end(csv_path)`, when given, prepares a run of the whole task and returns it;
+    that function is timed as the "process_dataset_task" stage.
+    """
+    csv_path = equipment_csv(data_dir, **scenario)
+    runs = {}
+
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="csv_analyzer_bench_") as work_dir:
+            for stage, record in _stage_runs(csv_path, work_dir, chart_workers, report_profile).items():
+                runs.setdefault(stage, []).append(record)
+
+        if end_to_end is not None:
+            task = end_to_end(csv_path)
+            with measured({}) as record:
+                task()
+            runs.setdefault("process_dataset_task", []).append(record)
+
+    return {
+        "id": scenario_id(scenario),
+        "scenario": scenario,
+        "file_bytes": os.path.getsize(csv_path),
+        "stages": {stage: best_of(records) for stage, records in runs.items()},
+    }
+
+
+def environment():
+    return {
+        "run_id": uuid.uuid4().hex,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "pipeline_version": PIPELINE_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+    }
+
+
+def compare(results, baseline, threshold=0.1, min_seconds=0.05, memory_threshold=0.2):
+    """Stage by stage changes against `baseline`, both as `manage.py benchmark --output` writes them.
+
+    A stage regressed when it got more than `threshold` slower (and by at least `min_seconds`,
+    below which timings are noise) or its peak memory grew by more than `memory_threshold`.
+    """
+    base = {scenario["id"]: scenario["stages"] for scenario in baseline.get("scenarios", [])}
+    rows = []
+    for scenario in results["scenarios"]:
+        for stage, current in scenario["stages"].items():
+            previous = base.get(scenario["id"], {}).get(stage)
+            if previous is None:
+                continue
+
+            wall_ratio = current["wall"] / previous["wall"] if previous["wall"] else None
+            slower = (
+                wall_ratio is not None
+                and wall_ratio > 1 + threshold
+                and current["wall"] - previous["wall"] >= min_seconds
+            )
+
+            memory_ratio = None
+            if current.get("peak_rss_mb") and previous.get("peak_rss_mb"):
+                memory_ratio = current["peak_rss_mb"] / previous["peak_rss_mb"]
+            bigger = memory_ratio is not None and memory_ratio > 1 + memory_threshold
+
+            rows.append({
+                "scenario": scenario["id"],
+                "stage": stage,
+                "baseline_wall": previous["wall"],
+                "wall": current["wall"],
+                "wall_ratio": round(wall_ratio, 3) if wall_ratio is not None else None,
+                "memory_ratio": round(memory_ratio, 3) if memory_ratio is not None else None,
+                "regression": slower or bigger,
+            })
+    return rows
@@ -0,0 +1,102 @@
+"""Deterministic equipment CSVs of any size, for the benchmarks.
+
+    python -m api.benchmarks.synthetic out.csv --rows 1000000 --cols 5 --types 20
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BASE_TYPES = ["Pump", "Valve", "Reactor", "HeatEx", "Compressor", "Condenser", "Mixer", "Separator"]
+BASE_COLUMNS = [("Flowrate", 100.0, 15.0), ("Pressure", 5.0, 0.8), ("Temperature", 210.0, 25.0)]
+CHUNK_ROWS = 500_000
+# the random draws come in fixed blocks of rows, each seeded by its index
+BLOCK_ROWS = 50_000
+
+
+def type_names(types):
+    names = BASE_TYPES[:types]
+    return names + [f"Type-{i:04d}" for i in range(len(names), types)]
+
+
+def numeric_columns(cols):
+    columns = BASE_COLUMNS[:cols]
+    return columns + [(f"Param_{i + 1}", 50.0 + i, 5.0 + i % 7) for i in range(len(columns), cols)]
+
+
+def _block(index, cols, types, null_ratio, outlier_rate, seed):
+    # the BLOCK_ROWS rows from index * BLOCK_ROWS on, column by column
+    rng = np.random.default_rng([seed, index])
+    names = np.array(type_names(types), dtype=object)
+
+    kinds = names[rng.integers(0, types, BLOCK_ROWS)]
+    kinds[rng.random(BLOCK_ROWS) < null_ratio] = None
+    block = {"Type": kinds}
+
+    for name, mean, std in numeric_columns(cols):
+        values = rng.normal(mean, std, BLOCK_ROWS)
+        spikes = rng.random(BLOCK_ROWS) < outlier_rate
+        values[spikes] *= rng.choice([-3, 5], spikes.sum())
+        values[rng.random(BLOCK_ROWS) < null_ratio] = np.nan
+        block[name] = values
+
+    return block
+
+
+def equipment_frame(start, rows, cols=3, types=5, null_ratio=0.02, outlier_rate=0.01, seed=0):
+    """Rows start..start+rows of the synthetic dataset; the same arguments always give the same rows."""
+    # cut from fixed blocks rather than seeded per call, so a file is identical however it is
+    # split into chunks, and a smaller file is the start of a larger one
+    end = start + rows
+    parts = []
+    for index in range(start // BLOCK_ROWS, -(-end // BLOCK_ROWS)):
+        offset = index * BLOCK_ROWS
+        block = _block(index, cols, types, null_ratio, outlier_rate, seed)
+        parts.append({name: values[max(start - offset, 0):end - offset] for name, values in block.items()})
+
+    data = {"Equipment Name": [f"EQ-{i}" for i in range(start, end)]}
+    for name in ["Type"] + [column[0] for column in numeric_columns(cols)]:
+        data[name] = np.concatenate([part[name] for part in parts]) if parts else np.array([], dtype=object)
+
+    return pd.DataFrame(data)
+
+
+def write_equipment_csv(path, rows, cols=3, types=5, null_ratio=0.02, outlier_rate=0.01, seed=0):
+    # written in chunks, so 50M rows need no more memory than 500k
+    partial = f"{path}.{os.getpid()}.part"
+    try:
+        for start in range(0, rows, CHUNK_ROWS):
+            frame = equipment_frame(start, min(CHUNK_ROWS, rows - start), cols, types, null_ratio, outlier_rate, seed)
+            frame.to_csv(partial, mode="a" if start else "w", header=not start, index=False, float_format="%.4f")
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def equipment_csv(data_dir, rows, cols=3, types=5, null_ratio=0.02, outlier_rate=0.01, seed=0):
+    """Path of the CSV for these arguments under `data_dir`, generated on first use."""
+    # v2: generated from fixed blocks, files made before that hold other rows
+    name = f"equipment_v2_r{rows}_c{cols}_t{types}_n{null_ratio:g}_o{outlier_rate:g}_s{seed}.csv"
+    path = os.path.join(data_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        write_equipment_csv(path, rows, cols, types, null_ratio, outlier_rate, seed)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--cols", type=int, default=3)
+    parser.add_argument("--types", type=int, default=5)
+    parser.add_argument("--null-ratio", type=float, default=0.02)
+    parser.add_argument("--outlier-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_equipment_csv(args.path, args.rows, args.cols, args.types, args.null_ratio, args.outlier_rate, args.seed)
+    print(f"{args.path}: {os.path.getsize(args.path)} bytes")
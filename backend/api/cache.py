@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Dataset, ResultCacheEntry
+from .utils import PIPELINE_VERSION
+from .utils.chart import SPECS_NAME
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "cache"
+CLEANED_NAME = "cleaned.parquet"
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    # fallback for datasets that were not hashed by HashingUploadHandler
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def render_settings():
+    # how the cached charts and report were rendered, a hit must not serve them in another form
+    return {
+        'profiles': settings.CHART_PROFILES,
+        'display_profile': settings.CHART_DISPLAY_PROFILE,
+        'report_profile': settings.CHART_REPORT_PROFILE,
+        'render_mode': settings.CHART_RENDER_MODE,
+    }
+
+
+def cache_key(content_hash, options):
+    payload = json.dumps([content_hash, PIPELINE_VERSION, options, render_settings()], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _media_path(name):
+    return os.path.join(settings.MEDIA_ROOT, name)
+
+
+def _media_name(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def _link(src, dst):
+    # hard links make a hit free in time and disk space; copy when the fs can't link
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def lookup(content_hash, options):
+    if not content_hash:
+        return None
+    return ResultCacheEntry.objects.filter(key=cache_key(content_hash, options)).first()
+
+
+def link_artifacts(entry, chart_dir, pdf_path, parquet_path=None):
+    """Link the cached charts, PDF and cleaned data to the paths a fresh run would have written.
+
+    Returns the linked cleaned data path, or None when the entry has no Parquet copy.
+    """
+    specs = _media_path(os.path.join(CACHE_DIR, entry.key, SPECS_NAME))
+    for name in json.loads(entry.chart_files):
+        # charts that were never rendered are rendered from the specs when requested
+        if os.path.exists(specs) and not os.path.exists(_media_path(name)):
+            continue
+        _link(_media_path(name), os.path.join(chart_dir, os.path.basename(name)))
+
+    if entry.pdf_file:
+        _link(_media_path(entry.pdf_file), pdf_path)
+
+    # lets the other chart profiles be rendered for the new dataset too
+    if os.path.exists(specs):
+        _link(specs, os.path.join(chart_dir, SPECS_NAME))
+
+    cleaned = _media_path(os.path.join(CACHE_DIR, entry.key, CLEANED_NAME))
+    if parquet_path and os.path.exists(cleaned):
+        _link(cleaned, parquet_path)
+        return parquet_path
+    return None
+
+
+def attach(entry, dataset_id):
+    ResultCacheEntry.objects.filter(id=entry.id).update(
+        ref_count=F('ref_count') + 1,
+        last_used_at=timezone.now()
+    )
+    Dataset.objects.filter(id=dataset_id).update(cache_entry=entry)
+
+
+def release(entry_id):
+    ResultCacheEntry.objects.filter(id=entry_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+def store(dataset_id, content_hash, options, charts, pdf_path, analysis_results, cleaned_path=None,
+          specs_path=None):
+    """Keep a copy of a finished run's artifacts under MEDIA_ROOT/cache/<key>/."""
+    if not content_hash:
+        return None
+
+    key = cache_key(content_hash, options)
+    entry_dir = _media_path(os.path.join(CACHE_DIR, key))
+    os.makedirs(entry_dir, exist_ok=True)
+
+    chart_files = []
+    size = 0
+    for path in charts:
+        dst = os.path.join(entry_dir, os.path.basename(path))
+        chart_files.append(_media_name(dst))
+        # charts are not rendered during the analysis with CHART_RENDER_MODE = "client"
+        if os.path.exists(path):
+            _link(path, dst)
+            size += os.path.getsize(dst)
+
+    pdf_file = None
+    if pdf_path and os.path.exists(pdf_path):
+        dst = os.path.join(entry_dir, "report.pdf")
+        _link(pdf_path, dst)
+        pdf_file = _media_name(dst)
+        size += os.path.getsize(dst)
+
+    if cleaned_path and os.path.exists(cleaned_path):
+        dst = os.path.join(entry_dir, CLEANED_NAME)
+        _link(cleaned_path, dst)
+        size += os.path.getsize(dst)
+
+    if specs_path and os.path.exists(specs_path):
+        dst = os.path.join(entry_dir, SPECS_NAME)
+        _link(specs_path, dst)
+        size += os.path.getsize(dst)
+
+    try:
+        with transaction.atomic():
+            entry = ResultCacheEntry.objects.create(
+                key=key,
+                content_hash=content_hash,
+                pipeline_version=PIPELINE_VERSION,
+                analysis_results=json.dumps(analysis_results),
+                chart_files=json.dumps(chart_files),
+                pdf_file=pdf_file,
+                size_bytes=size
+            )
+    except IntegrityError:
+        # another worker finished the same file first, share its entry
+        entry = ResultCacheEntry.objects.get(key=key)
+
+    attach(entry, dataset_id)
+    evict()
+    return entry
+
+
+def add_pdf(entry_id, pdf_path):
+    # reports built after the analysis (see api.reports) join the entry once they exist
+    entry = ResultCacheEntry.objects.filter(id=entry_id, pdf_file__isnull=True).first()
+    if entry is None:
+        return
+
+    dst = os.path.join(_media_path(os.path.join(CACHE_DIR, entry.key)), "report.pdf")
+    _link(pdf_path, dst)
+    ResultCacheEntry.objects.filter(id=entry.id, pdf_file__isnull=True).update(
+        pdf_file=_media_name(dst),
+        size_bytes=F('size_bytes') + os.path.getsize(dst)
+    )
+
+
+def evict(max_bytes=None):
+    """Drop least recently used entries no dataset links to until the cache fits."""
+    max_bytes = settings.RESULT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    total = ResultCacheEntry.objects.aggregate(total=Sum('size_bytes'))['total'] or 0
+
+    candidates = ResultCacheEntry.objects.filter(ref_count=0).order_by('last_used_at')
+    for entry in candidates.iterator():
+        if total <= max_bytes:
+            break
+
+        # re-check under the delete so an entry attached meanwhile is kept
+        deleted, _ = ResultCacheEntry.objects.filter(id=entry.id, ref_count=0).delete()
+        if not deleted:
+            continue
+
+        shutil.rmtree(_media_path(os.path.join(CACHE_DIR, entry.key)), ignore_errors=True)
+        total -= entry.size_bytes
+        logger.info(f"Evicted cached results {entry.key[:12]} ({entry.size_bytes} bytes)")
@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image
+
+from .files import file_etag
+from .models import Dataset
+from .utils.chart import SPECS_NAME, chart_series, load_specs, render_rendition, rendition_path
+
+VARIANT_DIR = "chart_variants"
+
+
+def chart_dir(dataset_id):
+    return os.path.join(settings.MEDIA_ROOT, "analysis", str(dataset_id), "charts")
+
+
+def chart_profile(name):
+    """The settings.CHART_PROFILES entry `name` in the form api.utils.chart renders."""
+    return {"name": name, **settings.CHART_PROFILES[name], "display": name == settings.CHART_DISPLAY_PROFILE}
+
+
+def dataset_charts(dataset):
+    """Absolute paths of the dataset's display charts in report order."""
+    names = json.loads(dataset.chart_files or "[]")
+    if names:
+        return [os.path.join(settings.MEDIA_ROOT, name) for name in names]
+
+    # datasets analysed before chart_files was recorded
+    charts = chart_dir(dataset.id)
+    if not os.path.isdir(charts):
+        return []
+    return [os.path.join(charts, name) for name in sorted(os.listdir(charts)) if name.endswith('.png')]
+
+
+def chart_data(dataset, max_points=None):
+    """Chart-ready series of every chart of `dataset`, from the specs saved with its charts."""
+    return [chart_series(spec, max_points) for spec in load_specs(chart_dir(dataset.id))]
+
+
+def record_renditions(dataset_id, profile):
+    # adds the profile's files that exist now to analysis_results["charts"]
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update().get(id=dataset_id)
+        if not dataset.analysis_results:
+            return
+        results = json.loads(dataset.analysis_results)
+        charts = results.setdefault('charts', {})
+
+        for path in dataset_charts(dataset):
+            name = os.path.splitext(os.path.basename(path))[0]
+            rendition = rendition_path(os.path.dirname(path), name, profile)
+            if os.path.exists(rendition):
+                relative = os.path.relpath(rendition, os.path.dirname(path)).replace(os.sep, '/')
+                charts.setdefault(name, {})[profile['name']] = relative
+
+        dataset.analysis_results = json.dumps(results)
+        dataset.save(update_fields=['analysis_results'])
+
+
+def chart_rendition(dataset, path, profile):
+    """The display chart at `path` rendered with `profile`, rendered and recorded on first use.
+
+    Raises FileNotFoundError when the chart can't be rendered again (no stored spec).
+    """
+    if profile.get('display') and os.path.exists(path):
+        return path
+
+    name = os.path.splitext(os.path.basename(path))[0]
+    rendition = rendition_path(os.path.dirname(path), name, profile)
+    if os.path.exists(rendition):
+        return rendition
+
+    rendition = render_rendition(os.path.dirname(path), name, profile)
+    if rendition is None:
+        raise FileNotFoundError(f"No chart spec to render {name} as {profile['name']}")
+    record_renditions(dataset.id, profile)
+    return rendition
+
+
+def chart_version(stat):
+    # goes into chart URLs, so a re-rendered chart gets a new URL instead of a stale cached copy
+    return file_etag(stat).strip('"')
+
+
+def specs_version(dataset_id):
+    # charts not rendered yet are versioned by the specs they will be rendered from
+    try:
+        return chart_version(os.stat(os.path.join(chart_dir(dataset_id), SPECS_NAME)))
+    except FileNotFoundError:
+        return None
+
+
+def variant_width(width):
+    # a few fixed sizes, so arbitrary ?width= values can't fill the disk with variants
+    widths = sorted(settings.CHART_VARIANT_WIDTHS)
+    return next((w for w in widths if w >= width), widths[-1])
+
+
+def chart_variant(path, width):
+    """`path` scaled down to `variant_width(width)`, rendered on first use and kept on disk.
+
+    The original itself when it is not wider than that.
+    """
+    target = variant_width(width)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    variant = os.path.join(os.path.dirname(os.path.dirname(path)), VARIANT_DIR, f"{stem}-w{target}{ext}")
+
+    original_mtime = os.stat(path).st_mtime
+    if os.path.exists(variant) and os.stat(variant).st_mtime >= original_mtime:
+        return variant
+
+    with Image.open(path) as img:
+        if img.width <= target:
+            return path
+        image_format = img.format
+        height = max(1, round(img.height * target / img.width))
+        resized = img.resize((target, height), Image.LANCZOS)
+
+    # rendered next to the target and renamed, concurrent requests at worst render it twice
+    os.makedirs(os.path.dirname(variant), exist_ok=True)
+    partial = f"{variant}.{os.getpid()}.{threading.get_ident()}.part"
+    try:
+        resized.save(partial, format=image_format, optimize=True)
+        os.replace(partial, variant)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return variant
+
+
+def image_size(path):
+    # PIL only reads the header here
+    with Image.open(path) as img:
+        return img.size
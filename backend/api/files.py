@@ -0,0 +1,142 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+CHUNK_SIZE = 64 * 1024
+
+
+def file_etag(stat):
+    # changes whenever the file is rewritten, without reading it
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single `bytes=` range, None to send the whole file.
+
+    Raises ValueError when the range can't be satisfied. Multiple ranges are answered with
+    the whole file, which RFC 9110 allows.
+    """
+    match = RANGE_RE.match(header.strip()) if header else None
+    if match is None:
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            # an empty file has no last bytes to send
+            raise ValueError(f"Range {header} is outside of {size} bytes")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(f"Range {header} is outside of {size} bytes")
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    # a Range only applies to the representation the client has the first part of
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith('"') or if_range.startswith('W/'):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _offload(path, size):
+    # the front web server sends the body (and handles Range itself), this worker is free right away
+    response = HttpResponse()
+    if settings.FILE_SERVE_BACKEND == 'x-accel-redirect':
+        name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(settings.FILE_SERVE_ACCEL_PREFIX.rstrip('/') + '/' + name)
+    elif settings.FILE_SERVE_BACKEND == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f"Unknown FILE_SERVE_BACKEND {settings.FILE_SERVE_BACKEND!r}")
+    response['Content-Length'] = str(size)
+    return response
+
+
+def serve_file(request, path, filename=None, as_attachment=True, content_type=None,
+               cache_control='private, no-cache'):
+    """Response sending the file at `path`, with validators and byte ranges.
+
+    Answers conditional requests (If-None-Match / If-Modified-Since) with 304 and single
+    `Range` requests with 206. With FILE_SERVE_BACKEND set, only headers are produced and
+    the front web server (nginx X-Accel-Redirect, Apache/lighttpd X-Sendfile) sends the file.
+    Raises FileNotFoundError like open() when the file is missing.
+
+    The default `cache_control` (private: behind a login; no-cache: revalidate, which the
+    validators make cheap) suits files that change under the same URL.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    filename = filename or os.path.basename(path)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = _file_response(request, path, stat, filename, as_attachment, content_type, etag)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    response['Cache-Control'] = cache_control
+    return response
+
+
+def _file_response(request, path, stat, filename, as_attachment, content_type, etag):
+    size = stat.st_size
+    disposition = content_disposition_header(as_attachment, filename)
+
+    if settings.FILE_SERVE_BACKEND:
+        response = _offload(path, size)
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = disposition
+        return response
+
+    # checked before the range itself: a range into a file that was replaced since (even by a
+    # shorter one) is answered with the whole new file, not 416
+    ranged = request.method in ('GET', 'HEAD') and _if_range_matches(request, etag, stat.st_mtime)
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size) if ranged else None
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{size}"
+        return response
+
+    if byte_range is None:
+        return FileResponse(open(path, 'rb'), as_attachment=as_attachment, filename=filename,
+                            content_type=content_type)
+
+    start, end = byte_range
+    length = end - start + 1
+    response = StreamingHttpResponse(_read_range(path, start, length), status=206, content_type=content_type)
+    response['Content-Range'] = f"bytes {start}-{end}/{size}"
+    response['Content-Length'] = str(length)
+    response['Content-Disposition'] = disposition
+    return response
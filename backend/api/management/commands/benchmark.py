@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.benchmarks import pipeline as bench
+
+
+class Command(BaseCommand):
+    help = "Benchmark the analysis pipeline on synthetic equipment CSVs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--preset', choices=sorted(bench.PRESETS), default='smoke',
+                            help="Row counts to run unless --rows is given (default: smoke)")
+        parser.add_argument('--rows', type=int, nargs='+', help="Row counts, e.g. --rows 10000 1000000")
+        parser.add_argument('--cols', type=int, nargs='+', default=[3], help="Numeric column counts")
+        parser.add_argument('--types', type=int, nargs='+', default=[5], help="Distinct Type values")
+        parser.add_argument('--null-ratio', type=float, nargs='+', default=[0.02], help="Share of missing values")
+        parser.add_argument('--outlier-rate', type=float, nargs='+', default=[0.01], help="Share of outliers")
+        parser.add_argument('--repeat', type=int, default=3, help="Runs per scenario, the fastest is kept")
+        parser.add_argument('--chart-workers', type=int, default=1, help="Processes rendering charts")
+        parser.add_argument('--no-end-to-end', action='store_true',
+                            help="Skip process_dataset_task, which needs a throwaway test database")
+        parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), "csv_analyzer_bench"),
+                            help="Where generated CSVs are kept between runs")
+        parser.add_argument('--output', help="Write the results as JSON to this file")
+        parser.add_argument('--baseline', help="Results file to compare with; exits with status 1 on regressions")
+        parser.add_argument('--threshold', type=float, default=0.1, help="Slowdown counted as a regression (0.1 = 10%%)")
+        parser.add_argument('--min-seconds', type=float, default=0.05, help="Smaller slowdowns are ignored as noise")
+        parser.add_argument('--memory-threshold', type=float, default=0.2, help="Peak memory growth counted as a regression")
+
+    def handle(self, *args, **options):
+        scenarios = bench.scenarios(
+            options['rows'] or bench.PRESETS[options['preset']],
+            options['cols'],
+            options['types'],
+            options['null_ratio'],
+            options['outlier_rate']
+        )
+        report_profile = {
+            "name": settings.CHART_REPORT_PROFILE,
+            **settings.CHART_PROFILES[settings.CHART_REPORT_PROFILE],
+        }
+
+        results = {"environment": bench.environment(), "scenarios": []}
+        with nullcontext() if options['no_end_to_end'] else _EndToEnd() as end_to_end:
+            for scenario in scenarios:
+                self.stdout.write(f"{bench.scenario_id(scenario)} ...")
+                result = bench.run_scenario(
+                    scenario,
+                    options['data_dir'],
+                    repeat=options['repeat'],
+                    chart_workers=options['chart_workers'],
+                    report_profile=report_profile,
+                    end_to_end=end_to_end
+                )
+                results["scenarios"].append(result)
+                for stage, record in result["stages"].items():
+                    self.stdout.write(f"  {stage:<35} {record['wall']:>9.3f}s  {record['peak_rss_mb'] or '?':>8} MB")
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['baseline']:
+            self.compare(results, options)
+
+    def compare(self, results, options):
+        with open(options['baseline']) as f:
+            baseline = json.load(f)
+
+        rows = bench.compare(
+            results,
+            baseline,
+            threshold=options['threshold'],
+            min_seconds=options['min_seconds'],
+            memory_threshold=options['memory_threshold']
+        )
+        if not rows:
+            self.stdout.write(self.style.WARNING("No scenario in common with the baseline"))
+            return
+
+        for row in rows:
+            line = (
+                f"{row['scenario']}  {row['stage']:<35} {row['baseline_wall']:>9.3f}s -> {row['wall']:>9.3f}s "
+                f"(x{row['wall_ratio']}, memory x{row['memory_ratio']})"
+            )
+            self.stdout.write(self.style.ERROR(line) if row['regression'] else line)
+
+        regressions = [row for row in rows if row['regression']]
+        if regressions:
+            raise CommandError(f"{len(regressions)} of {len(rows)} stages regressed against {options['baseline']}")
+        self.stdout.write(self.style.SUCCESS(f"No regressions in {len(rows)} stages"))
+
+
+class _EndToEnd:
+    """Runs process_dataset_task against a throwaway test database and media directory."""
+
+    def __enter__(self):
+        self.media_root = tempfile.mkdtemp(prefix="csv_analyzer_bench_media_")
+        self.settings = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings.enable()
+        self.old_db_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        self.user = User.objects.create_user(username="benchmark")
+        return self
+
+    def __exit__(self, *exc):
+        connection.creation.destroy_test_db(self.old_db_name, verbosity=0)
+        self.settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        return False
+
+    def __call__(self, csv_path):
+        # the upload itself is not timed: link the CSV in like an uploaded file
+        from api.models import Dataset
+        from api.tasks import process_dataset_task
+
+        name = f"datasets/{uuid.uuid4().hex}.csv"
+        target = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(csv_path, target)
+        except OSError:
+            shutil.copy2(csv_path, target)
+
+        # a content hash of its own, so the result cache never answers instead of the pipeline
+        dataset = Dataset.objects.create(user=self.user, dataset_file=name, content_hash=uuid.uuid4().hex)
+
+        def run():
+            if not process_dataset_task(dataset.id):
+                dataset.refresh_from_db()
+                raise CommandError(f"process_dataset_task failed: {dataset.error_log}")
+
+        return run
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from api.worker import JobDispatcher
+
+
+class Command(BaseCommand):
+    help = "Run the dataset processing workers that consume the job queue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help="Number of worker processes (default: PROCESSING_WORKERS)")
+        parser.add_argument('--poll-interval', type=float, help="Seconds between queue polls when idle")
+        parser.add_argument('--metrics-port', type=int, help="Serve Prometheus metrics on this port (default: PROCESSING_METRICS_PORT)")
+
+    def handle(self, *args, **options):
+        JobDispatcher(
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            metrics_port=options['metrics_port']
+        ).run()
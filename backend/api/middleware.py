@@ -0,0 +1,63 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.middleware.gzip import GZipMiddleware
+
+from .metrics import REQUEST_LATENCY
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # unresolved paths would give every 404 its own time series
+        return "unmatched"
+    view_class = getattr(match.func, 'view_class', None)
+    return view_class.__name__ if view_class else match.func.__name__
+
+
+class RequestMetricsMiddleware:
+    """Observes how long each view takes to produce its response (streamed bodies excluded)."""
+
+    # async too, so async views (the status streams) don't get pinned to a thread
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        response = self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        self.observe(request, response, start)
+        return response
+
+    def observe(self, request, response, start):
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            view=_view_name(request),
+            method=request.method,
+            status=response.status_code
+        )
+
+
+class JSONGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware for JSON responses only.
+
+    Files keep their byte ranges and strong ETags, and event streams are not held back by
+    the compressor.
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or not response.get('Content-Type', '').startswith('application/json'):
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0004_processingjob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResultCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=64, unique=True)),
+                ("content_hash", models.CharField(max_length=64)),
+                ("pipeline_version", models.CharField(max_length=20)),
+                ("analysis_results", models.TextField()),
+                ("chart_files", models.TextField(default="[]")),
+                ("pdf_file", models.CharField(blank=True, max_length=255, null=True)),
+                ("size_bytes", models.BigIntegerField(default=0)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("last_used_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="content_hash",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="cache_entry",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="datasets",
+                to="api.resultcacheentry",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0005_result_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="cleaned_file",
+            field=models.FileField(blank=True, null=True, upload_to="analysis/"),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0006_dataset_cleaned_file"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="timings",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0007_dataset_timings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataset",
+            name="progress",
+            field=models.TextField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.10 on 2026-10-18 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0008_dataset_progress"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="processingjob",
+            options={"ordering": ["priority", "created_at", "id"]},
+        ),
+        migrations.RemoveIndex(
+            model_name="processingjob",
+            name="api_process_status_1332e7_idx",
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="chart_files",
+            field=models.TextField(default="[]"),
+        ),
+        migrations.AddField(
+            model_name="dataset",
+            name="pdf_building_since",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="processingjob",
+            name="kind",
+            field=models.CharField(
+                choices=[("analysis", "Analysis"), ("report", "PDF report")],
+                default="analysis",
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="processingjob",
+            name="priority",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name="processingjob",
+            index=models.Index(
+                fields=["status", "priority", "created_at"],
+                name="api_process_status_cfd3f1_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.10 on 2026-10-18 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("api", "0009_lazy_pdf_reports"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="processingjob",
+            name="heartbeat_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -13,11 +13,81 @@ class Dataset(models.Model):
     dataset_file = models.FileField(upload_to="datasets/")
     pdf_file = models.FileField(upload_to="pdfs/", null=True, blank=True)
     analysis_results = models.TextField(null=True, blank=True)  
+    # Parquet copy of the cleaned data, written when pyarrow is installed
+    cleaned_file = models.FileField(upload_to="analysis/", null=True, blank=True)
+    # json: per pipeline stage wall/cpu seconds, memory and rows/columns/charts processed
+    timings = models.TextField(null=True, blank=True)
+    # json: current stage and percent complete while the dataset is processed
+    progress = models.TextField(null=True, blank=True)
+    # json: paths relative to MEDIA_ROOT of the charts, in report order
+    chart_files = models.TextField(default="[]")
+    # set while a request or worker builds the PDF report, see reports.ensure_report
+    pdf_building_since = models.DateTimeField(null=True, blank=True)
     
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     error_log = models.TextField(null=True, blank=True)
+
+    # sha256 of the uploaded file, used to reuse results of identical uploads
+    content_hash = models.CharField(max_length=64, null=True, blank=True, db_index=True)
+    cache_entry = models.ForeignKey(
+        'ResultCacheEntry', on_delete=models.SET_NULL, null=True, blank=True, related_name="datasets"
+    )
     
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.user.username} - {self.status} - {self.uploaded_at}"
\ No newline at end of file
+        return f"{self.user.username} - {self.status} - {self.uploaded_at}"
+
+class ProcessingJob(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('analysis', 'Analysis'),
+        ('report', 'PDF report'),
+    ]
+
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name="jobs")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='analysis')
+    # lower runs first, so report jobs wait until no analysis is queued
+    priority = models.PositiveSmallIntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=100, null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # refreshed by the dispatcher running the job, see requeue_stale_jobs
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['priority', 'created_at', 'id']
+        indexes = [models.Index(fields=['status', 'priority', 'created_at'])]
+
+    def __str__(self):
+        return f"Job {self.id} - {self.kind} of dataset {self.dataset_id} - {self.status}"
+
+
+class ResultCacheEntry(models.Model):
+    # key is sha256 over (content_hash, pipeline_version, options)
+    key = models.CharField(max_length=64, unique=True)
+    content_hash = models.CharField(max_length=64)
+    pipeline_version = models.CharField(max_length=20)
+
+    analysis_results = models.TextField()
+    # paths relative to MEDIA_ROOT of the cached copies under cache/<key>/
+    chart_files = models.TextField(default="[]")
+    pdf_file = models.CharField(max_length=255, null=True, blank=True)
+    size_bytes = models.BigIntegerField(default=0)
+
+    # number of datasets currently linked to these artifacts
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} (v{self.pipeline_version}) - {self.ref_count} refs"
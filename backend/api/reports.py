@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import cache as result_cache
+from .charts import chart_profile, record_renditions
+from .models import Dataset
+from .utils import pdf_report
+from .utils.progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+
+class ReportNotReady(Exception):
+    pass
+
+
+def _media_name(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def report_path(dataset_id):
+    return os.path.join(settings.MEDIA_ROOT, "pdfs", f"report_{dataset_id}.pdf")
+
+
+def report_args(dataset):
+    """pdf_report's arguments, rebuilt from what the analysis stored on the dataset."""
+    if not dataset.analysis_results:
+        raise ValueError(f"Dataset {dataset.id} has no analysis results to build a report from")
+
+    results = json.loads(dataset.analysis_results)
+    return {
+        'output_file': report_path(dataset.id),
+        'data_summary': {
+            'total_rows': results.get('total_rows', 0),
+            'stats': results.get('field_statistics', {}),
+            'equip_dist': results.get('equipment_distribution', {}),
+            'equip_averages': results.get('equipment_averages', {}),
+        },
+        'chart_files': [
+            os.path.join(settings.MEDIA_ROOT, name) for name in json.loads(dataset.chart_files or "[]")
+        ],
+        # rendered at print resolution by pdf_report when missing
+        'chart_profile': chart_profile(settings.CHART_REPORT_PROFILE),
+    }
+
+
+def claim_build(dataset_id):
+    # conditional update like claim_next_job, so one request or worker builds each report;
+    # a claim its builder stopped refreshing (heartbeat_builds) belongs to a builder that died
+    cutoff = timezone.now() - timedelta(seconds=settings.PDF_BUILD_STALE_AFTER)
+    return Dataset.objects.filter(
+        Q(pdf_file='') | Q(pdf_file__isnull=True),
+        Q(pdf_building_since__isnull=True) | Q(pdf_building_since__lt=cutoff),
+        id=dataset_id,
+        status='completed'
+    ).update(pdf_building_since=timezone.now()) == 1
+
+
+def heartbeat_builds(dataset_ids):
+    # the reports are still being built, however long that takes
+    return Dataset.objects.filter(id__in=dataset_ids, pdf_building_since__isnull=False).update(
+        pdf_building_since=timezone.now()
+    )
+
+
+def finish_build(dataset_id, pdf_path=None):
+    # without pdf_path the build failed; the next download claims it again
+    if not pdf_path:
+        Dataset.objects.filter(id=dataset_id).update(pdf_building_since=None)
+        return
+
+    Dataset.objects.filter(id=dataset_id).update(pdf_file=_media_name(pdf_path), pdf_building_since=None)
+
+    try:
+        record_renditions(dataset_id, chart_profile(settings.CHART_REPORT_PROFILE))
+    except Exception:
+        logger.exception(f"Could not record the report charts of dataset {dataset_id}")
+
+    # later uploads of the same file get the report with the cached results
+    entry_id = Dataset.objects.values_list('cache_entry_id', flat=True).get(id=dataset_id)
+    if entry_id:
+        try:
+            result_cache.add_pdf(entry_id, pdf_path)
+        except Exception:
+            logger.exception(f"Could not cache the report of dataset {dataset_id}")
+
+
+def build_report(dataset):
+    """Builds the claimed report of `dataset` in this process."""
+    start = time.perf_counter()
+    try:
+        args = report_args(dataset)
+        # the build's progress doubles as the heartbeat of its claim
+        heartbeat = ProgressReporter(
+            sink=lambda _: heartbeat_builds([dataset.id]), interval=settings.PROCESSING_HEARTBEAT_INTERVAL
+        )
+        pdf_report(**args, progress=heartbeat)
+    except Exception:
+        finish_build(dataset.id)
+        raise
+
+    finish_build(dataset.id, args['output_file'])
+    logger.info(f"Built the report of dataset {dataset.id} in {time.perf_counter() - start:.2f}s")
+
+
+def ensure_report(dataset):
+    """The dataset's PDF, built now unless it exists.
+
+    ReportNotReady while another request or worker builds it; callers come back later
+    rather than wait for that build or start their own.
+    """
+    if not dataset.pdf_file:
+        claimed = claim_build(dataset.id)
+        if claimed:
+            build_report(dataset)
+        dataset.refresh_from_db(fields=['pdf_file', 'pdf_building_since'])
+        if not dataset.pdf_file and not claimed:
+            raise ReportNotReady(f"The report of dataset {dataset.id} is still being built")
+
+    return dataset.pdf_file
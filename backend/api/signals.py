@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .cache import release
+from .models import Dataset
+
+
+@receiver(post_delete, sender=Dataset)
+def release_cache_entry(sender, instance, **kwargs):
+    if instance.cache_entry_id:
+        release(instance.cache_entry_id)
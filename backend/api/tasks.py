@@ -1,84 +1,272 @@
 import os
 import json
 import logging
-import threading
+import time
+from datetime import timedelta
 from django.conf import settings
 from django.db import transaction
-from .models import Dataset
-from .utils import process_csv, visualization_csv, pdf_report
+from django.db.models import F, Q
+from django.utils import timezone
+from . import cache as result_cache
+from . import metrics
+from .models import Dataset, ProcessingJob
+from .charts import chart_profile
+from .reports import finish_build, report_path
+from .utils import analyze_dataset
 
 logger = logging.getLogger(__name__)
 
-def process_dataset_task(dataset_id):
+# ProcessingJob.priority of report jobs; analyses use the default 0 and are claimed first
+REPORT_PRIORITY = 10
+
+
+class QueueFull(Exception):
+    pass
+
+
+def prepare_dataset(dataset_id):
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update().get(id=dataset_id)
+        dataset.status = 'processing'
+        dataset.progress = json.dumps({'stage': 'preparing', 'percent': 0})
+        dataset.save()
+
+    csv_path = dataset.dataset_file.path
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"CSV file missing at: {csv_path}")
+
+    if not dataset.content_hash:
+        dataset.content_hash = result_cache.hash_file(csv_path)
+        Dataset.objects.filter(id=dataset.id).update(content_hash=dataset.content_hash)
+
+    # make required directories if it doesn't exist to store csv files, charts ad pdf's
+    base_dir = os.path.join(settings.MEDIA_ROOT, "analysis", str(dataset.id))
+    chart_dir = os.path.join(base_dir, "charts")
+    pdf_path = report_path(dataset.id)
+    
+    os.makedirs(chart_dir, exist_ok=True)
+    os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+
+    build_pdf = settings.PDF_REPORT_MODE == 'eager'
+    chart_profiles = [chart_profile(settings.CHART_DISPLAY_PROFILE)]
+    if build_pdf:
+        chart_profiles.append(chart_profile(settings.CHART_REPORT_PROFILE))
+
+    # arguments for analyze_dataset, which may run in another process
+    return {
+        'csv_path': csv_path,
+        'chart_dir': chart_dir,
+        'pdf_path': pdf_path,
+        'parquet_path': os.path.join(base_dir, "cleaned.parquet"),
+        'options': dict(settings.ANALYSIS_OPTIONS),
+        'chart_workers': settings.CHART_RENDER_WORKERS,
+        'trace_memory': settings.ANALYSIS_TRACE_MEMORY,
+        'progress_interval': settings.ANALYSIS_PROGRESS_INTERVAL,
+        # otherwise the report is built later, see PDF_REPORT_MODE
+        'build_pdf': build_pdf,
+        'chart_profiles': chart_profiles,
+        # see CHART_RENDER_MODE
+        'render_charts': settings.CHART_RENDER_MODE == 'server',
+        'report_profile': chart_profile(settings.CHART_REPORT_PROFILE),
+    }
+
+
+def _media_name(path):
+    return os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+
+
+def complete_dataset(dataset_id, result):
+    with transaction.atomic():
+        dataset = Dataset.objects.select_for_update().get(id=dataset_id)
+        if result.get('pdf_file'):
+            dataset.pdf_file.name = _media_name(result['pdf_file'])
+        dataset.chart_files = json.dumps([_media_name(path) for path in result.get('charts', [])])
+        dataset.analysis_results = json.dumps(result['analysis_results'])
+        dataset.timings = json.dumps(result['timings']) if result.get('timings') else None
+        if result.get('cleaned_file'):
+            dataset.cleaned_file.name = _media_name(result['cleaned_file'])
+        dataset.status = 'completed'
+        dataset.progress = json.dumps({'stage': 'completed', 'percent': 100})
+        dataset.error_log = None
+        dataset.save()
+
+    metrics.DATASETS_FINISHED.inc(status='completed')
+    metrics.observe_timings(result.get('timings'))
+
+    if not result.get('pdf_file') and settings.PDF_REPORT_MODE == 'background':
+        enqueue_report(dataset_id)
+
+
+def complete_from_cache(dataset_id, job_args):
+    # identical file analysed before with the same pipeline and options: link its artifacts
+    dataset = Dataset.objects.get(id=dataset_id)
+    entry = result_cache.lookup(dataset.content_hash, job_args['options'])
+    if entry is None:
+        return False
+
+    start = time.perf_counter()
+    try:
+        cleaned_file = result_cache.link_artifacts(
+            entry, job_args['chart_dir'], job_args['pdf_path'], job_args.get('parquet_path')
+        )
+    except OSError:
+        logger.warning(f"Cached results {entry.key[:12]} are incomplete, reprocessing", exc_info=True)
+        return False
+
+    complete_dataset(dataset_id, {
+        'charts': [os.path.join(job_args['chart_dir'], os.path.basename(name)) for name in json.loads(entry.chart_files)],
+        'pdf_file': job_args['pdf_path'] if entry.pdf_file else None,
+        'analysis_results': json.loads(entry.analysis_results),
+        'cleaned_file': cleaned_file,
+        'timings': {'cache_hit': {'wall': round(time.perf_counter() - start, 4)}},
+    })
+    result_cache.attach(entry, dataset_id)
+    logger.info(f"Dataset {dataset_id} completed from cached results {entry.key[:12]}")
+    return True
+
+
+def cache_results(dataset_id, job_args, result):
+    # a failure here only costs a future cache miss, never the dataset itself
     try:
-        
-        with transaction.atomic():
-            dataset = Dataset.objects.select_for_update().get(id=dataset_id)
-            dataset.status = 'processing'
-            dataset.save()
-
-        csv_path = dataset.dataset_file.path
-        if not os.path.exists(csv_path):
-            raise FileNotFoundError(f"CSV file missing at: {csv_path}")
-
-        # make required directories if it doesn't exist to store csv files, charts ad pdf's
-        base_dir = os.path.join(settings.MEDIA_ROOT, "analysis", str(dataset.id))
-        chart_dir = os.path.join(base_dir, "charts")
-        pdf_dir = os.path.join(settings.MEDIA_ROOT, "pdfs")
-        
-        os.makedirs(chart_dir, exist_ok=True)
-        os.makedirs(pdf_dir, exist_ok=True)
-
-        # do csv processing
-        df, stats = process_csv(csv_path)
-
-        # create charts
-        viz = visualization_csv(
-            df, 
-            chart_dir, 
-            outlier_counts=stats.get('outliers', {}),
-            equip_dist=stats.get('equip_dist', {}),
-            equip_averages=stats.get('equip_averages', {})
+        content_hash = Dataset.objects.values_list('content_hash', flat=True).get(id=dataset_id)
+        result_cache.store(
+            dataset_id,
+            content_hash,
+            job_args['options'],
+            result['charts'],
+            result.get('pdf_file'),
+            result['analysis_results'],
+            result.get('cleaned_file'),
+            result.get('chart_specs')
         )
-        charts = viz.plots() 
-
-        pdf_filename = f"report_{dataset.id}.pdf"
-        pdf_path = os.path.join(pdf_dir, pdf_filename)
-        
-        # pdf generation
-        pdf_report(pdf_path, stats, charts)
-
-        #analysis results for Chart.js
-        analysis_results = {
-            'total_rows': stats.get('total_rows', 0),
-            'equipment_distribution': stats.get('equip_dist', {}),
-            'equipment_averages': stats.get('equip_averages', {}),
-            'field_statistics': stats.get('stats', {}),
-            'outliers': stats.get('outliers', {}),
-            'numeric_columns': list(df.select_dtypes(include=['number']).columns.tolist()),
-            'correlation_data': df.select_dtypes(include=['number']).corr().to_dict() if df.select_dtypes(include=['number']).shape[1] >= 2 else {}
-        }
-
-        with transaction.atomic():
-            dataset = Dataset.objects.select_for_update().get(id=dataset_id)
-            dataset.pdf_file.name = f"pdfs/{pdf_filename}"
-            dataset.analysis_results = json.dumps(analysis_results)
-            dataset.status = 'completed'
-            dataset.error_log = None
-            dataset.save()
+    except Exception:
+        logger.exception(f"Could not cache results of dataset {dataset_id}")
+
+
+def set_progress(dataset_id, stage, percent, **details):
+    # read by the status endpoints, see DatasetStatusStream; details as sent by ProgressReporter
+    progress = {'stage': stage, 'percent': percent, **details}
+    Dataset.objects.filter(id=dataset_id, status='processing').update(progress=json.dumps(progress))
+
+
+def fail_dataset(dataset_id, error):
+    Dataset.objects.filter(id=dataset_id).update(
+        status='failed', 
+        error_log=str(error)
+    )
+    metrics.DATASETS_FINISHED.inc(status='failed')
+
+
+def process_dataset_task(dataset_id):
+    # runs the whole pipeline in the calling process; the queue workers use the same steps
+    # but hand analyze_dataset to a process pool
+    try:
+        job_args = prepare_dataset(dataset_id)
+        if complete_from_cache(dataset_id, job_args):
+            return True
+
+        result = analyze_dataset(**job_args, on_progress=lambda progress: set_progress(dataset_id, **progress))
+        complete_dataset(dataset_id, result)
+        cache_results(dataset_id, job_args, result)
+        return True
 
     except Exception as e:
         logger.exception(f"Failed to process dataset {dataset_id}")
-        Dataset.objects.filter(id=dataset_id).update(
-            status='failed', 
-            error_log=str(e)
+        fail_dataset(dataset_id, e)
+        return False
+
+
+def queue_depth(kind=None):
+    jobs = ProcessingJob.objects.filter(status='queued')
+    if kind:
+        jobs = jobs.filter(kind=kind)
+    return jobs.count()
+
+
+def queue_is_full():
+    # report jobs are cheap and only run when the queue is otherwise empty
+    return queue_depth(kind='analysis') >= settings.PROCESSING_QUEUE_MAX_DEPTH
+
+
+def enqueue_dataset(dataset_id):
+    # jobs are picked up by the workers started with `manage.py process_jobs`
+    if queue_is_full():
+        raise QueueFull(f"Processing queue is full ({settings.PROCESSING_QUEUE_MAX_DEPTH} jobs waiting)")
+
+    job = ProcessingJob.objects.create(dataset_id=dataset_id)
+    logger.info(f"Queued job {job.id} for Dataset ID: {dataset_id}")
+    return job
+
+
+def enqueue_report(dataset_id):
+    job = ProcessingJob.objects.create(dataset_id=dataset_id, kind='report', priority=REPORT_PRIORITY)
+    logger.info(f"Queued report job {job.id} for Dataset ID: {dataset_id}")
+    return job
+
+
+def claim_next_job(worker_name):
+    # conditional update instead of SELECT ... FOR UPDATE so that claiming also works on sqlite
+    while True:
+        job = ProcessingJob.objects.filter(status='queued').order_by('priority', 'created_at', 'id').first()
+        if job is None:
+            return None
+
+        claimed = ProcessingJob.objects.filter(id=job.id, status='queued').update(
+            status='running',
+            worker=worker_name,
+            started_at=timezone.now(),
+            heartbeat_at=timezone.now(),
+            attempts=F('attempts') + 1
         )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def finish_job(job, succeeded):
+    now = timezone.now()
+    ProcessingJob.objects.filter(id=job.id).update(
+        status='done' if succeeded else 'failed',
+        finished_at=now
+    )
+
+    if job.started_at:
+        metrics.JOB_DURATION.observe((job.started_at - job.created_at).total_seconds(), phase='queued')
+        metrics.JOB_DURATION.observe((now - job.started_at).total_seconds(), phase='running')
+
 
-def start_processing_thread(dataset_id):
-    thread = threading.Thread(
-        target=process_dataset_task,
-        args=(dataset_id,),
-        daemon=True  
+def retry_or_fail_job(job, error):
+    # the worker died or crashed, so the dataset may be stuck in 'processing'
+    # (or, for a report job, its report claimed by no one)
+    if job.kind == 'report':
+        finish_build(job.dataset_id)
+
+    if job.attempts < settings.PROCESSING_MAX_ATTEMPTS:
+        ProcessingJob.objects.filter(id=job.id).update(status='queued', worker=None, started_at=None, heartbeat_at=None)
+        if job.kind == 'analysis':
+            Dataset.objects.filter(id=job.dataset_id).update(status='pending', progress=None)
+        logger.warning(f"Requeued job {job.id} for Dataset ID {job.dataset_id}: {error}")
+        return
+
+    finish_job(job, succeeded=False)
+    if job.kind == 'analysis':
+        # the dataset itself is fine when only its report could not be built
+        fail_dataset(job.dataset_id, error)
+    logger.error(f"Giving up on job {job.id} for Dataset ID {job.dataset_id} after {job.attempts} attempts")
+
+
+def heartbeat_jobs(job_ids):
+    # the jobs are still being worked on, however long they have been running
+    return ProcessingJob.objects.filter(id__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs():
+    # running jobs without a recent heartbeat belong to a dispatcher that was killed or restarted
+    cutoff = timezone.now() - timedelta(seconds=settings.PROCESSING_JOB_TIMEOUT)
+    stale = ProcessingJob.objects.filter(status='running').filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff)
     )
-    thread.start()
-    logger.info(f"Asynchronous thread started for Dataset ID: {dataset_id}")
\ No newline at end of file
+
+    for job in stale:
+        retry_or_fail_job(job, "Worker stopped before the job finished")
+    return len(stale)
@@ -1,9 +1,17 @@
 from django.urls import path
-from .views import DatasetUpload, UserDatasetList, DownloadPDF, DatasetStatus
+from .views import (
+    DatasetUpload, UserDatasetList, DownloadPDF, DatasetStatus, DatasetStatusStream, DatasetCharts, DatasetChartData,
+    DatasetChart, Metrics
+)
 
 urlpatterns = [
     path('upload-dataset/', DatasetUpload.as_view(), name='upload_dataset'),
     path('datasets/', UserDatasetList.as_view(), name='user_datasets'),
     path('dataset-status/<int:dataset_id>/', DatasetStatus.as_view(), name='dataset_status'),
+    path('dataset-status/<int:dataset_id>/stream/', DatasetStatusStream.as_view(), name='dataset_status_stream'),
     path('download-pdf/<int:dataset_id>/', DownloadPDF.as_view(), name='download_pdf'),
+    path('dataset-charts/<int:dataset_id>/', DatasetCharts.as_view(), name='dataset_charts'),
+    path('dataset-charts/<int:dataset_id>/data/', DatasetChartData.as_view(), name='dataset_chart_data'),
+    path('dataset-charts/<int:dataset_id>/<str:name>/', DatasetChart.as_view(), name='dataset_chart'),
+    path('metrics/', Metrics.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,5 +1,7 @@
+from .context import AnalysisContext
 from .csv import process_csv
 from .chart import visualization_csv
 from .pdf import pdf_report
+from .pipeline import PIPELINE_VERSION, analyze_dataset
 
-__all__ = ['process_csv', 'visualization_csv', 'pdf_report']
\ No newline at end of file
+__all__ = ['AnalysisContext', 'process_csv', 'visualization_csv', 'pdf_report', 'analyze_dataset', 'PIPELINE_VERSION']
\ No newline at end of file
@@ -1,140 +1,394 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
+import json
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import matplotlib
+import numpy as np
+import pandas as pd
+import seaborn as sns
+from matplotlib import cbook
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from .context import AnalysisContext
 
 #setting globalcolor to viridis
-plt.rcParams['axes.prop_cycle'] = plt.cycler(color=sns.color_palette("viridis", 10))
+matplotlib.rcParams['axes.prop_cycle'] = matplotlib.cycler(color=sns.color_palette("viridis", 10))
+
+SPECS_NAME = "specs.json"
+
+# a profile is how one use of the charts is rendered: "format" is anything Figure.savefig
+# writes (png, webp, svg, ...), "dpi" is ignored by vector formats. The display profile is
+# written to the chart directory itself, every other profile to a folder named after it.
+DISPLAY_PROFILE = {"name": "screen", "format": "png", "dpi": 100, "display": True}
+
+
+def _apply_theme():
+    # also used as the pool initializer, rcParams are per process
+    sns.set_theme(style="ticks")
+
+
+def _pie(ax, spec):
+    colors = sns.color_palette('viridis', n_colors=len(spec['labels']))
+
+    ax.pie(
+        spec['sizes'],
+        labels=spec['labels'],
+        autopct='%1.1f%%',
+        startangle=90,
+        colors=colors,
+    )
+
+    ax.set_title('Equipment Type Distribution', fontsize=14, fontweight='bold')
+
+
+def _bar(ax, spec):
+    colors = sns.color_palette("viridis", len(spec['labels']))
+
+    bars = ax.bar(spec['labels'], spec['values'], color=colors)
+    ax.bar_label(bars, fmt='%.2f', padding=3)
+
+    ax.set_title(f"Average {spec['field']} per Equipment Type")
+    ax.set_ylabel('Value')
+    sns.despine(ax=ax)
+
+
+def _box(ax, spec):
+    # drawn from precomputed statistics so the column itself never leaves the parent
+    ax.bxp(
+        [spec['stats']],
+        vert=False,
+        patch_artist=True,
+        widths=0.8,
+        boxprops={'facecolor': sns.color_palette("viridis")[3]},
+        medianprops={'color': '0.2'},
+        flierprops={'marker': 'd', 'markerfacecolor': '0.2', 'markersize': 4},
+    )
+
+    ax.set_yticks([])
+    ax.set_xlabel(spec['column'])
+    ax.set_title(f"Outlier Distribution: {spec['column']} ({spec['count']} outliers detected)")
+    sns.despine(ax=ax)
+
+
+def _heatmap(ax, spec):
+    corr = pd.DataFrame(spec['matrix'], index=spec['columns'], columns=spec['columns'])
+
+    sns.heatmap(
+        corr,
+        annot=True,
+        cmap='viridis',
+        fmt=".2f",
+        square=True,
+        ax=ax
+    )
+
+    ax.set_title('Parameter Correlation Matrix', fontsize=14, fontweight='bold')
+
+
+RENDERERS = {
+    'pie': ((10, 10), _pie),
+    'bar': ((10, 5), _bar),
+    'box': ((10, 4), _box),
+    'heatmap': ((10, 8), _heatmap),
+}
+
+
+def rendition_path(output_dir, name, profile):
+    # the display profile keeps the flat layout chart_files and the result cache rely on
+    folder = output_dir if profile.get('display') else os.path.join(output_dir, profile['name'])
+    return os.path.join(folder, f"{name}.{profile['format']}")
+
+
+def render_chart(spec, output_dir, profile=DISPLAY_PROFILE):
+    """Render one chart spec with `profile`; safe to call from any process or thread."""
+    figsize, draw = RENDERERS[spec['kind']]
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    draw(fig.add_subplot(), spec)
+
+    # save charts to charts in media folder, renamed into place so readers never see half a file
+    path = rendition_path(output_dir, spec['name'], profile)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    partial = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+    fig.tight_layout()
+    try:
+        fig.savefig(partial, format=profile['format'], dpi=profile.get('dpi', 'figure'), bbox_inches='tight')
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def _json_default(value):
+    # numpy values in the specs: box plot statistics, the correlation matrix
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def save_specs(specs, output_dir):
+    # kept with the charts, so other profiles can be rendered later without the data
+    path = os.path.join(output_dir, SPECS_NAME)
+    with open(path, 'w') as f:
+        json.dump(specs, f, default=_json_default)
+    return path
+
+
+def load_specs(output_dir):
+    path = os.path.join(output_dir, SPECS_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_rendition(output_dir, name, profile, specs=None):
+    """Renders chart `name` with `profile` from the specs saved next to it.
+
+    None when the specs don't include it, e.g. for datasets analysed before they were kept.
+    """
+    specs = load_specs(output_dir) if specs is None else specs
+    spec = next((spec for spec in specs if spec['name'] == name), None)
+    if spec is None:
+        return None
+    _apply_theme()
+    return render_chart(spec, output_dir, profile)
+
+
+def renditions(chart_files, profile):
+    """`chart_files` (display charts) as rendered with `profile`, rendering missing ones now.
+
+    Charts that can't be rendered again are used as they are.
+    """
+    specs = {}
+    paths = []
+    for path in chart_files:
+        output_dir, filename = os.path.split(path)
+        name = os.path.splitext(filename)[0]
+        target = rendition_path(output_dir, name, profile)
+        if not os.path.exists(target):
+            if output_dir not in specs:
+                specs[output_dir] = load_specs(output_dir)
+            target = render_rendition(output_dir, name, profile, specs[output_dir]) or path
+        paths.append(target)
+    return paths
+
+
+def _finite(values):
+    # JSON has no NaN, e.g. correlations of constant columns
+    return [None if value is None or not np.isfinite(value) else float(value) for value in values]
+
+
+def _sample(values, max_points):
+    # evenly spaced over the sorted values, so the extremes are always kept
+    values = sorted(values)
+    if max_points is None or len(values) <= max_points:
+        return values
+    if max_points <= 1:
+        return values[-1:] if max_points == 1 else []
+    return [values[int(i)] for i in np.linspace(0, len(values) - 1, max_points).round()]
+
+
+def chart_series(spec, max_points=None):
+    """The series a client needs to draw `spec` itself, as column arrays.
+
+    `max_points` caps the outlier points of box plots.
+    """
+    data = {'name': spec['name'], 'kind': spec['kind']}
+
+    if spec['kind'] == 'pie':
+        data.update(labels=spec['labels'], values=spec['sizes'])
+    elif spec['kind'] == 'bar':
+        data.update(field=spec['field'], labels=spec['labels'], values=_finite(spec['values']))
+    elif spec['kind'] == 'box':
+        stats = spec['stats']
+        fliers = list(stats.get('fliers', []))
+        data.update(
+            column=spec['column'],
+            outlier_count=spec['count'],
+            stats=['min', 'q1', 'median', 'q3', 'max', 'mean'],
+            values=_finite([stats[key] for key in ('whislo', 'q1', 'med', 'q3', 'whishi', 'mean')]),
+            outliers=_finite(_sample(fliers, max_points)),
+            outliers_total=len(fliers),
+        )
+    elif spec['kind'] == 'heatmap':
+        data.update(columns=spec['columns'], matrix=[_finite(row) for row in spec['matrix']])
+
+    return data
+
+
+def chart_renditions(output_dir, rendered):
+    """{chart name: {profile name: path relative to output_dir}} from {profile name: [paths]}."""
+    charts = {}
+    for profile_name, paths in rendered.items():
+        for path in paths:
+            name = os.path.splitext(os.path.basename(path))[0]
+            relative = os.path.relpath(path, output_dir).replace(os.sep, '/')
+            charts.setdefault(name, {})[profile_name] = relative
+    return charts
+
 
 class CSVPlots:
-    def __init__(self, df, output_dir, equip_dist=None, equip_averages=None):
+    def __init__(self, df, output_dir, equip_dist=None, equip_averages=None, workers=1, context=None,
+                 profiles=None):
         self.df = df
+        # shares the numeric block and correlation matrix with the rest of the pipeline
+        self.context = context if context is not None else AnalysisContext(df)
         self.output_dir = output_dir
-        self.outlier_counts = {} 
+        self.outlier_counts = {}
         self.equip_dist = equip_dist or {}
         self.equip_averages = equip_averages or {}
+        self.workers = workers
+        # profiles rendered right away, the first display one is what render() returns
+        self.profiles = profiles or [DISPLAY_PROFILE]
+        self.renditions = {}
+        self.specs_file = None
         os.makedirs(output_dir, exist_ok=True)
-        sns.set_theme(style="ticks")
-
-    def save_plot(self, filename):
-        # save charts to charts in media folder
-        path = os.path.join(self.output_dir, filename)
-        plt.tight_layout()
-        plt.savefig(path, dpi=300, bbox_inches='tight')
-        plt.close('all')
-        return path
-    
-    def boxplots(self):
+        _apply_theme()
+
+    def render(self, specs):
+        """Paths of the display charts, in spec order; every profile's paths go to self.renditions."""
+        progress = self.context.progress
+        jobs = [(spec, profile) for profile in self.profiles for spec in specs]
+        total = len(jobs)
+        progress.update("charts", 0, total, charts_done=0, charts_total=total)
+
+        workers = min(self.workers or 1, total)
+        if workers <= 1:
+            paths = []
+            for spec, profile in jobs:
+                paths.append(render_chart(spec, self.output_dir, profile))
+                progress.update("charts", len(paths), total, charts_done=len(paths), charts_total=total)
+        else:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_apply_theme) as pool:
+                futures = [pool.submit(render_chart, spec, self.output_dir, profile) for spec, profile in jobs]
+                for done, _ in enumerate(as_completed(futures), 1):
+                    progress.update("charts", done, total, charts_done=done, charts_total=total)
+                # results in submission order, so the chart order doesn't depend on timing
+                paths = [future.result() for future in futures]
+
+        for i, profile in enumerate(self.profiles):
+            self.renditions[profile['name']] = paths[i * len(specs):(i + 1) * len(specs)]
+        return self.renditions[self.display_profile['name']]
+
+    @property
+    def display_profile(self):
+        return next((p for p in self.profiles if p.get('display')), self.profiles[0])
+
+    def boxplot_specs(self):
         # box plots if oultiers exist
-        outlier_plots = []
-        
+        specs = []
+
         for col, count in self.outlier_counts.items():
-            if col not in self.df.columns: 
+            if col not in self.df.columns:
                 continue
-            
-            plt.figure(figsize=(10, 4))
-            
-            sns.boxplot(x=self.df[col], orient="h", color=sns.color_palette("viridis")[3])
-            
-            plt.title(f"Outlier Distribution: {col} ({count} outliers detected)")
-            sns.despine() 
-            
-            save_path = self.save_plot(f"outlier_{col}.png")
-            outlier_plots.append(save_path)
-            
-        return outlier_plots
 
-    def pie_chart(self):
+            stats = cbook.boxplot_stats(self.df[col].dropna().to_numpy(dtype=float), whis=1.5)[0]
+
+            specs.append({
+                'kind': 'box',
+                'name': f"outlier_{col}",
+                'column': col,
+                'count': count,
+                'stats': stats,
+            })
+
+        return specs
+
+    def pie_chart_spec(self):
         # pie chart for equipment type distribution
         if not self.equip_dist:
             return None
-        
-        labels = list(self.equip_dist.keys())
-        sizes = list(self.equip_dist.values())
-        
-        plt.figure(figsize=(10, 10))
-        
-        colors = sns.color_palette('viridis', n_colors=len(labels))
-        
-        plt.pie(
-            sizes, 
-            labels=labels, 
-            autopct='%1.1f%%',
-            startangle=90,
-            colors=colors,
-        )
-        
-        plt.title('Equipment Type Distribution', fontsize=14, fontweight='bold')
-        return self.save_plot("equip_dist_pie.png")
 
-    def equipment_averages_chart(self):
+        return {
+            'kind': 'pie',
+            'name': "equip_dist_pie",
+            'labels': list(self.equip_dist.keys()),
+            'sizes': list(self.equip_dist.values()),
+        }
+
+    def equipment_averages_specs(self):
         # bar charts for mean of each parameter for each equipment type
         if not self.equip_averages:
             return []
-        
-        avg_plots = []
+
         equipment_types = list(self.equip_averages.keys())
         fields = list(self.equip_averages[equipment_types[0]].keys()) if equipment_types else []
 
-        for field in fields:
-            plt.figure(figsize=(10, 5))
-            
-            values = [self.equip_averages[et].get(field, 0) for et in equipment_types]
-            
-            colors = sns.color_palette("viridis", len(equipment_types))
-            
-            bars = plt.bar(equipment_types, values, color=colors)
-            
-            plt.bar_label(bars, fmt='%.2f', padding=3)
-            
-            plt.title(f'Average {field} per Equipment Type')
-            plt.ylabel('Value')
-            sns.despine()
-            
-            avg_plots.append(self.save_plot(f"avg_{field}.png"))
-        
-        return avg_plots
+        return [
+            {
+                'kind': 'bar',
+                'name': f"avg_{field}",
+                'field': field,
+                'labels': equipment_types,
+                'values': [self.equip_averages[et].get(field, 0) for et in equipment_types],
+            }
+            for field in fields
+        ]
 
-    def corr_matrix(self):
+    def corr_matrix_spec(self):
         # corr matrix to find correlation between parameters
-        numeric_df = self.df.select_dtypes(include=['number'])
-        
-        if numeric_df.shape[1] < 2: 
+        corr = self.context.corr()
+        if corr is None:
             return None
-        
-        plt.figure(figsize=(10, 8))
-        
-        sns.heatmap(
-            numeric_df.corr(), 
-            annot=True, 
-            cmap='viridis', 
-            fmt=".2f",
-            square=True
-        )
-        
-        plt.title('Parameter Correlation Matrix', fontsize=14, fontweight='bold')
-        return self.save_plot("correlation_matrix.png")
-
-    def plots(self):
-        
-        plots_pdf = []
-        
-        pie_path = self.pie_chart()
-        if pie_path:
-            plots_pdf.append(pie_path)
-        
-        plots_pdf.extend(self.equipment_averages_chart())
-        plots_pdf.extend(self.boxplots())
-        
-        corr_path = self.corr_matrix()
-        if corr_path:
-            plots_pdf.append(corr_path)
-        
-        return plots_pdf
-
-def visualization_csv(df, output_dir, outlier_counts=None, equip_dist=None, equip_averages=None):
-    
-    viz = CSVPlots(df, output_dir, equip_dist, equip_averages)
+
+        return {
+            'kind': 'heatmap',
+            'name': "correlation_matrix",
+            'columns': corr.columns.tolist(),
+            'matrix': corr.to_numpy(),
+        }
+
+    def chart_specs(self):
+        specs = []
+
+        pie = self.pie_chart_spec()
+        if pie:
+            specs.append(pie)
+
+        specs.extend(self.equipment_averages_specs())
+        specs.extend(self.boxplot_specs())
+
+        corr = self.corr_matrix_spec()
+        if corr:
+            specs.append(corr)
+
+        return specs
+
+    def boxplots(self):
+        return self.render(self.boxplot_specs())
+
+    def pie_chart(self):
+        spec = self.pie_chart_spec()
+        return self.render([spec])[0] if spec else None
+
+    def equipment_averages_chart(self):
+        return self.render(self.equipment_averages_specs())
+
+    def corr_matrix(self):
+        spec = self.corr_matrix_spec()
+        return self.render([spec])[0] if spec else None
+
+    def plots(self, render=True):
+        # without render only the specs are written; the display charts are rendered from them
+        # when someone asks for them, at the paths returned here
+        specs = self.chart_specs()
+        self.specs_file = save_specs(specs, self.output_dir)
+        if not render:
+            return [rendition_path(self.output_dir, spec['name'], self.display_profile) for spec in specs]
+        return self.render(specs)
+
+def visualization_csv(df, output_dir, outlier_counts=None, equip_dist=None, equip_averages=None, workers=1,
+                      context=None, profiles=None):
+
+    viz = CSVPlots(df, output_dir, equip_dist, equip_averages, workers=workers, context=context,
+                   profiles=profiles)
     if outlier_counts:
         viz.outlier_counts = outlier_counts
-    return viz
\ No newline at end of file
+    return viz
@@ -0,0 +1,151 @@
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from .progress import ProgressReporter
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# "pairwise" is DataFrame.corr (pairwise-complete, exact); the others are one BLAS product
+CORRELATION_METHODS = ("pairwise", "float64", "float32")
+
+_UNSET = object()
+
+
+class AnalysisContext:
+    """Derived data of one analysed frame, computed on first use and shared by every stage.
+
+    process_csv binds the cleaned frame and its stats; CSVPlots and analyze_dataset then
+    read the numeric block and correlation matrix from here instead of recomputing them.
+    Stages wrapped in `timed()` are recorded in `timings`, see there; stages report how far
+    they got through `progress`.
+    """
+
+    def __init__(self, df=None, stats=None, correlation="pairwise", progress=None):
+        if correlation not in CORRELATION_METHODS:
+            raise ValueError(f"Unknown correlation method {correlation!r}, expected one of {CORRELATION_METHODS}")
+        self.correlation = correlation
+        self.progress = progress or ProgressReporter()
+        self.timings = {}
+        # allocation peaks of the enclosing stages, since every stage resets tracemalloc's peak
+        self._peaks = []
+        self.bind(df, stats)
+
+    def bind(self, df, stats=None):
+        self.df = df
+        self.stats = stats or {}
+        self._numeric = None
+        self._corr = _UNSET
+        return self
+
+    @contextmanager
+    def timed(self, stage):
+        """Records wall and CPU seconds and memory of the wrapped block under `timings[stage]`.
+
+        Yields the record so the stage can add what it processed (rows, columns, charts).
+        CPU time includes child processes that finished inside the block, e.g. chart
+        renderers. `max_rss_mb` is the process high-water mark so far; `peak_alloc_mb`, the
+        stage's own peak, is only there while tracemalloc is tracing.
+        """
+        record = {}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            if self._peaks:
+                self._peaks[-1] = max(self._peaks[-1], tracemalloc.get_traced_memory()[1])
+            self._peaks.append(0)
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), _cpu_seconds()
+
+        try:
+            yield record
+        finally:
+            record["wall"] = round(time.perf_counter() - wall, 4)
+            record["cpu"] = round(_cpu_seconds() - cpu, 4)
+            rss = _max_rss_mb()
+            if rss is not None:
+                record["max_rss_mb"] = rss
+            if tracing and tracemalloc.is_tracing():
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                if self._peaks:
+                    self._peaks[-1] = max(self._peaks[-1], peak)
+                record["peak_alloc_mb"] = round(peak / 2 ** 20, 1)
+            self.timings[stage] = record
+
+    @property
+    def numeric_df(self):
+        if self._numeric is None:
+            self._numeric = self.df.select_dtypes(include=['number'])
+        return self._numeric
+
+    @property
+    def numeric_columns(self):
+        return self.numeric_df.columns.tolist()
+
+    def corr(self):
+        """Correlation matrix of the numeric columns, None with fewer than two of them."""
+        if self._corr is _UNSET:
+            with self.timed("correlation") as stage:
+                self._corr = self._compute_corr()
+                stage["columns"] = 0 if self._corr is None else len(self._corr)
+        return self._corr
+
+    def _compute_corr(self):
+        # streaming mode accumulates the exact matrix, df is only a row sample there
+        if self.stats.get("correlation"):
+            return pd.DataFrame(self.stats["correlation"])
+
+        numeric = self.numeric_df
+        if numeric.shape[1] < 2:
+            return None
+
+        if self.correlation == "pairwise":
+            return numeric.corr()
+
+        dtype = np.float32 if self.correlation == "float32" else np.float64
+        values = numeric.to_numpy(dtype=dtype)
+        if np.isnan(values).any():
+            # a single product can't skip missing pairs
+            logger.info("Numeric data has missing values, using pairwise correlation")
+            return numeric.corr()
+        return _blas_corr(values, numeric.columns)
+
+
+def _cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _max_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def _blas_corr(values, columns):
+    # standardise once, then one matrix product gives every pair, O(n·k²) in BLAS
+    centred = values - values.mean(axis=0)
+    norms = np.sqrt((centred * centred).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        scaled = centred / norms
+    corr = np.clip(scaled.T @ scaled, -1.0, 1.0).astype(np.float64)
+
+    # constant columns have no correlation, like DataFrame.corr
+    constant = norms == 0
+    corr[constant, :] = np.nan
+    corr[:, constant] = np.nan
+    np.fill_diagonal(corr, np.where(constant, np.nan, 1.0))
+    return pd.DataFrame(corr, index=columns, columns=columns)
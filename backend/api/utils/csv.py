@@ -1,14 +1,105 @@
+import os
 import pandas as pd
 import numpy as np
 import logging
+from .sketch import KLLSketch, kll_rank_error
+from .context import AnalysisContext
+from .streaming import StreamingCSVProcessor
 logger = logging.getLogger(__name__)
 
+# files above this size are processed in chunks instead of loaded whole
+STREAMING_THRESHOLD_BYTES = 256 * 1024 * 1024
+
+# string columns with fewer distinct values than this share of rows become categoricals
+CATEGORY_MAX_RATIO = 0.5
+CATEGORY_PROBE_ROWS = 10_000
+
+def _has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def read_csv(file_path, engine="auto"):
+    # Arrow's reader parses blocks on all cores, pandas' C parser uses one
+    if engine == "auto":
+        engine = "pyarrow" if _has_pyarrow() else "c"
+
+    if engine == "pyarrow":
+        try:
+            return pd.read_csv(file_path, engine="pyarrow")
+        except (pd.errors.EmptyDataError, FileNotFoundError):
+            raise
+        except Exception as e:
+            # Arrow is stricter about malformed rows than the C parser
+            logger.warning(f"Arrow CSV reader failed on {file_path} ({e}), falling back to the C parser")
+
+    return pd.read_csv(file_path)
+
+def write_cleaned(df, path):
+    """Writes the cleaned frame as Parquet; returns the path, or None when it couldn't be written."""
+    if not _has_pyarrow():
+        logger.info("pyarrow is not installed, skipping the Parquet copy")
+        return None
+    try:
+        df.to_parquet(path, index=False)
+    except Exception:
+        logger.warning(f"Could not write the cleaned data to {path}", exc_info=True)
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+    return path
+
+def read_cleaned(path, columns=None):
+    # typed columnar copy written by process_csv, much cheaper to load than the raw CSV
+    return pd.read_parquet(path, columns=columns)
+
+def _present(series):
+    # copy of the non-missing values in the column's own dtype, free to reorder
+    values = series.to_numpy()
+    if values.dtype.kind == "f":
+        # boolean indexing already copies
+        return values[~np.isnan(values)]
+    return values.copy()
+
+def _percentiles(values, qs):
+    # the same np.percentile call Series.quantile makes, but allowed to reorder values in place
+    if not values.size:
+        return np.full(len(qs), np.nan)
+    return np.percentile(values, np.asarray(qs) * 100.0, overwrite_input=True)
+
+def _columns_array(df, cols):
+    # column-major float64 copy, so each column written back is one contiguous slice
+    values = np.empty((len(df), len(cols)), order="F")
+    for i, col in enumerate(cols):
+        values[:, i] = df[col].to_numpy()
+    return values
+
+def _holds(dtype, value):
+    # True when value survives a round trip through dtype, e.g. 3.0 in int16 or 0.5 in float32
+    with np.errstate(invalid='ignore', over='ignore'):
+        return bool(np.array(value).astype(dtype) == value)
+
+def _low_cardinality(series):
+    # the head rules out unique-ish columns (names, ids) without hashing every row
+    head = series.head(CATEGORY_PROBE_ROWS)
+    if head.nunique() >= CATEGORY_MAX_RATIO * len(head):
+        return False
+    return series.nunique() < CATEGORY_MAX_RATIO * len(series)
+
 class DataAnalysisError(Exception):
     pass
 
 class CSVProcessor:
-    def __init__(self, df: pd.DataFrame):
-        self.df = df.copy()
+    def __init__(self, df: pd.DataFrame, copy: bool = True, quantiles: str = "exact", sketch_k: int = 200):
+        # callers that own the frame can skip the copy and its 2x peak memory
+        self.df = df.copy() if copy else df
+        # "sketch" trades the per-column sort for a KLL sketch, see kll_rank_error(sketch_k)
+        self.quantile_method = quantiles
+        self.sketch_k = sketch_k
+        # per-column scratch copies clean_data hands to handle_outliers, see quantile_table
+        self._selection = {}
         self.identify_columns()
 
     def identify_columns(self):
@@ -16,84 +107,268 @@ class CSVProcessor:
         self.numeric_cols = self.df.select_dtypes(include=[np.number]).columns.tolist()
         self.categorical_cols = self.df.select_dtypes(exclude=[np.number]).columns.tolist()
 
+    def optimize_dtypes(self, arrow_strings: bool = False) -> dict:
+        """Shrinks columns to compact dtypes without changing any value.
+
+        Low-cardinality strings become categoricals, integers the narrowest int type and
+        floats float32 only when every value survives the round trip. Returns the memory
+        per column before and after, in bytes.
+        """
+        before = self.df.memory_usage(deep=True, index=False)
+        old_dtypes = self.df.dtypes.astype(str)
+
+        if arrow_strings and not _has_pyarrow():
+            logger.warning("pyarrow is not installed, keeping object strings")
+            arrow_strings = False
+
+        for col in self.numeric_cols:
+            series = self.df[col]
+            if pd.api.types.is_integer_dtype(series):
+                self.df[col] = pd.to_numeric(series, downcast="integer")
+            elif pd.api.types.is_float_dtype(series) and series.dtype != np.float32:
+                narrow = series.astype(np.float32)
+                # NaN != NaN, so compare the present values only
+                present = series.notna()
+                if narrow[present].astype(series.dtype).equals(series[present]):
+                    self.df[col] = narrow
+
+        for col in self.categorical_cols:
+            series = self.df[col]
+            if not pd.api.types.is_object_dtype(series):
+                continue
+            if _low_cardinality(series):
+                self.df[col] = series.astype("category")
+            elif arrow_strings:
+                self.df[col] = series.astype("string[pyarrow]")
+
+        new_dtypes = self.df.dtypes.astype(str)
+        # deep measuring walks every string, so only remeasure the converted columns
+        changed = new_dtypes.index[new_dtypes != old_dtypes]
+        after = before.copy()
+        if len(changed):
+            after[changed] = self.df[changed].memory_usage(deep=True, index=False)
+
+        return {
+            "before": int(before.sum()),
+            "after": int(after.sum()),
+            "columns": {
+                col: {
+                    "dtype_before": old_dtypes[col],
+                    "dtype_after": new_dtypes[col],
+                    "before": int(before[col]),
+                    "after": int(after[col]),
+                }
+                for col in self.df.columns
+            },
+        }
+
+    def quantile_table(self, cols, qs, keep=False) -> pd.DataFrame:
+        # one row per q, one column per entry in cols
+        table = {}
+        for col in cols:
+            if self.quantile_method == "sketch":
+                sketch = KLLSketch(self.sketch_k)
+                sketch.update(self.df[col].to_numpy(dtype=float))
+                table[col] = sketch.quantile(qs)
+                continue
+
+            # a copy left partially ordered by the previous call selects several times faster
+            values = self._selection.pop(col, None)
+            if values is None:
+                values = _present(self.df[col])
+            table[col] = _percentiles(values, qs)
+            if keep:
+                self._selection[col] = values
+
+        return pd.DataFrame(table, index=qs, columns=cols)
+
     def clean_data(self):
         # replace Nan with median for numerical and unknown for categorical values
-        for col in self.numeric_cols:
-            if self.df[col].isnull().any():
-                self.df[col] = self.df[col].fillna(self.df[col].median())
+        missing = self.df.isnull().sum()
+
+        num = [col for col in self.numeric_cols if missing[col]]
+        if num:
+            medians = self.quantile_table(num, [0.5], keep=True).iloc[0]
+            values = _columns_array(self.df, num)
+            np.copyto(values, medians.to_numpy()[np.newaxis, :], where=np.isnan(values))
+            # fillna keeps the column dtype, float32 included
+            self._assign(num, values)
+
+            # handle_outliers needs the quartiles of the filled columns: the kept copies
+            # plus one median per filled hole
+            for col in self._selection:
+                kept = self._selection[col]
+                self._selection[col] = np.concatenate([kept, np.full(missing[col], medians[col], dtype=kept.dtype)])
         
         for col in self.categorical_cols:
-            if self.df[col].isnull().any():
+            if missing[col]:
+                if isinstance(self.df[col].dtype, pd.CategoricalDtype) and "Unknown" not in self.df[col].cat.categories:
+                    self.df[col] = self.df[col].cat.add_categories("Unknown")
                 self.df[col] = self.df[col].fillna("Unknown")
 
     def handle_outliers(self, strategy="cap") -> dict:
         # use iqr to find if outliers exist. if they exist boxplot is plotted. 
-        outlier_counts = {}
+        self.outlier_counts = {}
+        if not self.numeric_cols:
+            return self.outlier_counts
 
-        for col in self.numeric_cols:
-            q1, q3 = self.df[col].quantile([0.25, 0.75])
-            iqr = q3 - q1
-            
-            if iqr == 0:
-                continue
+        q = self.quantile_table(self.numeric_cols, [0.25, 0.75]).to_numpy(dtype=float)
+        self._selection.clear()
+
+        q1, q3 = q[0], q[1]
+        iqr = q3 - q1
+        lower = pd.Series(q1 - 1.5 * iqr, index=self.numeric_cols)
+        upper = pd.Series(q3 + 1.5 * iqr, index=self.numeric_cols)
+
+        # columns without spread are left alone
+        spread = iqr != 0
+        cols = lower.index[spread]
+        lower, upper = lower[spread], upper[spread]
+
+        values = _columns_array(self.df, cols)
+        low, high = lower.to_numpy(), upper.to_numpy()
+        below = (values < low).sum(axis=0)
+        above = (values > high).sum(axis=0)
+        counts = below + above
+        flagged = counts > 0
+
+        if strategy == "cap" and flagged.any():
+            # Capping ensures extreme values don't skew the final averages
+            capped = np.clip(values[:, flagged], low[flagged], high[flagged])
 
-            lower_bound = q1 - 1.5 * iqr
-            upper_bound = q3 + 1.5 * iqr
-            
-            mask = (self.df[col] < lower_bound) | (self.df[col] > upper_bound)
+            # like Series.clip, upcast only when a bound that replaced values doesn't fit the dtype
+            keep_dtype = [
+                (not below[i] or _holds(self.df[col].dtype, low[i])) and (not above[i] or _holds(self.df[col].dtype, high[i]))
+                for i, col in zip(np.flatnonzero(flagged), cols[flagged])
+            ]
+            self._assign(cols[flagged], capped, keep_dtype)
 
-            if mask.any():
-                outlier_counts[col] = int(mask.sum())
-                if strategy == "cap":
-                    # Capping ensures extreme values don't skew the final averages
-                    self.df[col] = self.df[col].clip(lower_bound, upper_bound)
+        self.outlier_counts = {col: int(n) for col, n in zip(cols, counts) if n > 0}
+        return self.outlier_counts
 
-        self.outlier_counts = outlier_counts
-        return outlier_counts
+    def _assign(self, cols, values, keep_dtype=None):
+        # writes float64 results back column by column, which is cheap unlike a multi-column setitem
+        for i, col in enumerate(cols):
+            if keep_dtype is None or keep_dtype[i]:
+                self.df[col] = values[:, i].astype(self.df[col].dtype, copy=False)
+            else:
+                self.df[col] = values[:, i]
 
     def get_stats(self) -> dict:
-        return self.df[self.numeric_cols].describe().round(2).to_dict()
+        if self.quantile_method != "sketch":
+            # float32 columns give float32 stats, which round to 2.190000057 instead of 2.19
+            return self.df[self.numeric_cols].describe().astype(float).round(2).to_dict()
+
+        numeric = self.df[self.numeric_cols]
+        table = numeric.agg(["count", "mean", "std", "min", "max"])
+        quartiles = self.quantile_table(self.numeric_cols, [0.25, 0.5, 0.75])
+        quartiles.index = ["25%", "50%", "75%"]
+        table = pd.concat([table.loc[["count", "mean", "std", "min"]], quartiles, table.loc[["max"]]])
+        return table.astype(float).round(2).to_dict()
+
+    def approximation(self):
+        if self.quantile_method != "sketch":
+            return None
+        return {"quantiles": "kll", "rank_error": round(kll_rank_error(self.sketch_k), 4), "one_pass": False}
     
     def equip_dist(self) -> dict:
         # frequency of each equipment type
         if "Type" not in self.df.columns:
             return {}
-        return self.df["Type"].value_counts().to_dict()
+        types = self.df["Type"]
+        if isinstance(types.dtype, pd.CategoricalDtype):
+            # counting the codes keeps first-seen order for ties, like an object column
+            counts = types.cat.codes.value_counts()
+            counts = counts[counts.index >= 0]
+            counts.index = types.cat.categories[counts.index]
+            return counts.to_dict()
+        return types.value_counts().to_dict()
     
     def equip_averages(self) -> dict:
         # finding mean of each numerical parameter for each type of equipment
         if "Type" not in self.df.columns or not self.numeric_cols:
             return {}
         
-        averages = self.df.groupby("Type")[self.numeric_cols].mean().round(2)
+        # observed=True: a categorical Type would otherwise add rows for unused categories
+        averages = self.df.groupby("Type", observed=True)[self.numeric_cols].mean().astype(float).round(2)
+        # categoricals group in category order, object columns alphabetically
+        averages = averages.set_axis(averages.index.astype(object)).sort_index()
         return averages.to_dict(orient='index')
 
 
-def process_csv(file_path: str):
+def process_csv(file_path: str, outlier_strategy: str = "cap", streaming=None,
+                streaming_threshold: int = STREAMING_THRESHOLD_BYTES, chunksize: int = 200_000,
+                quantiles: str = "exact", one_pass: bool = False, optimize_dtypes: bool = True,
+                arrow_strings: bool = False, engine: str = "auto", parquet_path: str = None,
+                context: AnalysisContext = None):
+    # context: receives the cleaned frame, its stats and per-stage timings for later stages
+    context = context or AnalysisContext()
+
+    if streaming is None:
+        streaming = os.path.getsize(file_path) > streaming_threshold
 
+    if streaming:
+        # bounded memory; returns a row sample for charting instead of the full frame
+        try:
+            with context.timed("stream") as stage:
+                processor = StreamingCSVProcessor(file_path, chunksize=chunksize, progress=context.progress)
+                df, stats = processor.run(
+                    strategy=outlier_strategy,
+                    one_pass=one_pass,
+                    parquet_path=parquet_path if _has_pyarrow() else None
+                )
+                stage["rows"], stage["columns"] = stats["total_rows"], len(stats["columns"])
+        except Exception:
+            logger.exception(f"Streaming analysis of {file_path} couldn't be completed.")
+            raise
+        context.bind(df, stats)
+        return df, stats
+
+    context.progress.update("reading")
     try:
-        df = pd.read_csv(file_path)
+        with context.timed("read") as stage:
+            df = read_csv(file_path, engine=engine)
+            stage["rows"], stage["columns"] = df.shape
     except Exception:
         logger.exception(f"Fatal error: Could not read CSV file at {file_path}")
         raise
 
-    processor = CSVProcessor(df)
+    processor = CSVProcessor(df, copy=False, quantiles=quantiles)
+    with context.timed("optimize_dtypes") as stage:
+        memory = processor.optimize_dtypes(arrow_strings=arrow_strings) if optimize_dtypes else None
+        stage["columns"] = df.shape[1]
 
+    context.progress.update("cleaning", rows=len(df))
     try:
-        processor.clean_data()
-        processor.handle_outliers(strategy="cap")
+        with context.timed("clean") as stage:
+            processor.clean_data()
+            stage["rows"], stage["columns"] = df.shape
+        with context.timed("outliers") as stage:
+            processor.handle_outliers(strategy=outlier_strategy)
+            stage["rows"], stage["columns"] = len(df), len(processor.numeric_cols)
     except Exception:
         logger.exception("Preprocessing of data couldn't be completed.")
         raise
 
-    return (
-        processor.df,
-        {
+    context.progress.update("statistics", rows=len(df))
+    with context.timed("stats") as stage:
+        stage["columns"] = len(processor.numeric_cols)
+        stats = {
             "total_rows": len(processor.df),
             "stats": processor.get_stats(),
             "outliers": processor.outlier_counts,
             "equip_dist": processor.equip_dist(),
             "equip_averages": processor.equip_averages(),
             "columns": processor.df.columns.tolist(),
-        },
-    )
\ No newline at end of file
+        }
+    if processor.approximation():
+        stats["approximation"] = processor.approximation()
+    if memory:
+        stats["memory"] = memory
+    if parquet_path:
+        with context.timed("parquet") as stage:
+            stage["rows"] = len(df)
+            stats["cleaned_file"] = write_cleaned(processor.df, parquet_path)
+
+    context.bind(processor.df, stats)
+    return processor.df, stats
\ No newline at end of file
@@ -1,9 +1,15 @@
+import os
+import threading
+
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image, PageBreak
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.lib.pagesizes import A4
 
+from .chart import renditions
+from .progress import ProgressReporter
+
 class ReportGenerator:
     def __init__(self, filename, report_title="Report"):
         self.filename = filename
@@ -94,11 +100,33 @@ class ReportGenerator:
             self.story.append(img)
             self.story.append(Spacer(1, 0.3 * inch))
 
-    def build(self):
+    def build(self, progress=None):
+        if progress is not None:
+            self.doc.setProgressCallBack(self._progress_callback(progress))
         self.doc.build(self.story)
 
-def pdf_report(output_file, data_summary, chart_files):
-    report = ReportGenerator(output_file, "Chemical Equipment Analysis Report")
+    @staticmethod
+    def _progress_callback(progress):
+        # reportlab reports the number of flowables up front, then flowables laid out and pages
+        state = {'SIZE_EST': 0, 'PROGRESS': 0, 'PAGE': 0}
+
+        def callback(kind, value):
+            if kind not in state:
+                return
+            state[kind] = value
+            progress.update("pdf", state['PROGRESS'], state['SIZE_EST'], pages=state['PAGE'])
+
+        return callback
+
+def pdf_report(output_file, data_summary, chart_files, progress=None, chart_profile=None):
+    progress = progress or ProgressReporter()
+    progress.update("pdf", pages=0)
+    # the report embeds its own rendering of the charts, made now if the analysis didn't
+    if chart_profile:
+        chart_files = renditions(chart_files, chart_profile)
+    # built next to the target and renamed, so a download never sees a half written report
+    partial_file = f"{output_file}.{os.getpid()}.{threading.get_ident()}.part"
+    report = ReportGenerator(partial_file, "Chemical Equipment Analysis Report")
     
     report.add_heading("Processing Summary")
     report.create_table([
@@ -123,4 +151,10 @@ def pdf_report(output_file, data_summary, chart_files):
     if chart_files:
         report.chart_section(chart_files)
     
-    report.build()
\ No newline at end of file
+    try:
+        report.build(progress)
+        os.replace(partial_file, output_file)
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+    return output_file
\ No newline at end of file
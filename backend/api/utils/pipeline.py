@@ -0,0 +1,116 @@
+import logging
+import tracemalloc
+
+from .context import AnalysisContext
+from .csv import STREAMING_THRESHOLD_BYTES, process_csv
+from .chart import chart_renditions, visualization_csv
+from .pdf import pdf_report
+from .progress import ProgressReporter
+
+logger = logging.getLogger(__name__)
+
+# bump whenever a change alters the produced results, so cached results are not reused
+PIPELINE_VERSION = "5"
+
+
+def analyze_dataset(csv_path, chart_dir, pdf_path, options=None, chart_workers=1, parquet_path=None,
+                    trace_memory=False, on_progress=None, progress_interval=1.0, build_pdf=True,
+                    chart_profiles=None, report_profile=None, render_charts=True):
+    # runs in a worker process, so only file paths go in and plain dicts/lists come out;
+    # on_progress gets the stage and percent complete at most every progress_interval seconds.
+    # Without build_pdf the report is left to api.reports, which builds it from the results.
+    # chart_profiles are rendered now (see chart.DISPLAY_PROFILE), the report embeds report_profile.
+    # Without render_charts only the chart specs are saved, for clients that draw the charts.
+    options = options or {}
+    context = AnalysisContext(
+        correlation=options.get('correlation', 'pairwise'),
+        progress=ProgressReporter(on_progress, interval=progress_interval)
+    )
+
+    # per-stage allocation peaks; tracemalloc slows pandas down noticeably, so it is opt-in
+    trace = trace_memory and not tracemalloc.is_tracing()
+    if trace:
+        tracemalloc.start()
+
+    try:
+        with context.timed("total"):
+            result = _analyze(context, csv_path, chart_dir, pdf_path if build_pdf else None, options, chart_workers,
+                              parquet_path, chart_profiles, report_profile, render_charts)
+    finally:
+        if trace:
+            tracemalloc.stop()
+
+    walls = ", ".join(f"{stage} {record['wall']}s" for stage, record in context.timings.items())
+    logger.info(f"Analysis of {csv_path}: {walls}")
+
+    result['timings'] = context.timings
+    return result
+
+
+def _analyze(context, csv_path, chart_dir, pdf_path, options, chart_workers, parquet_path, chart_profiles,
+             report_profile, render_charts):
+    df, stats = process_csv(
+        csv_path,
+        outlier_strategy=options.get('outlier_strategy', 'cap'),
+        streaming_threshold=options.get('streaming_threshold_bytes', STREAMING_THRESHOLD_BYTES),
+        quantiles=options.get('quantiles', 'exact'),
+        one_pass=options.get('approximate_outliers', False),
+        optimize_dtypes=options.get('optimize_dtypes', True),
+        arrow_strings=options.get('arrow_strings', False),
+        engine=options.get('csv_engine', 'auto'),
+        parquet_path=parquet_path,
+        context=context
+    )
+
+    # computed once here, the heatmap and analysis results both read it from the context
+    corr = context.corr()
+
+    # create charts
+    viz = visualization_csv(
+        df, 
+        chart_dir, 
+        outlier_counts=stats.get('outliers', {}),
+        equip_dist=stats.get('equip_dist', {}),
+        equip_averages=stats.get('equip_averages', {}),
+        workers=chart_workers,
+        context=context,
+        profiles=chart_profiles
+    )
+    with context.timed("charts") as stage:
+        charts = viz.plots(render=render_charts)
+        stage["charts"] = len(charts)
+
+    # pdf generation
+    if pdf_path:
+        with context.timed("pdf") as stage:
+            pdf_report(pdf_path, stats, charts, progress=context.progress, chart_profile=report_profile)
+            stage["charts"] = len(charts)
+
+    #analysis results for Chart.js
+    analysis_results = {
+        'total_rows': stats.get('total_rows', 0),
+        'equipment_distribution': stats.get('equip_dist', {}),
+        'equipment_averages': stats.get('equip_averages', {}),
+        'field_statistics': stats.get('stats', {}),
+        'outliers': stats.get('outliers', {}),
+        'numeric_columns': context.numeric_columns,
+        'correlation_data': corr.to_dict() if corr is not None else {},
+        # rendered files per chart and profile, relative to the chart directory
+        'charts': chart_renditions(chart_dir, viz.renditions),
+    }
+
+    # quantile error bound when sketches were used
+    if 'approximation' in stats:
+        analysis_results['approximation'] = stats['approximation']
+
+    # bytes per column before and after dtype optimisation
+    if 'memory' in stats:
+        analysis_results['memory'] = stats['memory']
+
+    return {
+        'charts': charts,
+        'chart_specs': viz.specs_file,
+        'pdf_file': pdf_path,
+        'analysis_results': analysis_results,
+        'cleaned_file': stats.get('cleaned_file'),
+    }
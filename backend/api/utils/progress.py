@@ -0,0 +1,66 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# percent of the whole analysis at which each stage starts and ends
+STAGE_SPANS = {
+    "reading": (5, 30),
+    "cleaning": (30, 45),
+    "statistics": (45, 50),
+    "charts": (50, 85),
+    "pdf": (85, 99),
+}
+
+
+class ProgressReporter:
+    """Throttled progress of one analysis, passed to `sink` as a dict.
+
+    e.g. {"stage": "charts", "percent": 62, "charts_done": 3, "charts_total": 8}. Stages
+    report as often as they like (per chunk, chart or page); updates within `interval`
+    seconds of the last one sent are dropped unless the stage changed. Without a sink
+    nothing is sent at all.
+    """
+
+    def __init__(self, sink=None, interval=1.0):
+        self.sink = sink
+        self.interval = interval
+        self.stage = None
+        self.percent = 0
+        self._sent_at = None
+
+    def update(self, stage, done=None, total=None, **details):
+        # done/total: how far into the stage, e.g. bytes read or charts rendered
+        start, end = STAGE_SPANS[stage]
+        fraction = min(done / total, 1.0) if done is not None and total else 0.0
+        self.percent = max(self.percent, int(start + (end - start) * fraction))
+
+        new_stage = stage != self.stage
+        self.stage = stage
+        if self.sink is None:
+            return
+
+        now = time.monotonic()
+        if not new_stage and self._sent_at is not None and now - self._sent_at < self.interval:
+            return
+        self._sent_at = now
+
+        try:
+            self.sink({"stage": stage, "percent": self.percent, **details})
+        except Exception:
+            # progress is informational, it must never fail the analysis
+            logger.warning("Could not report progress", exc_info=True)
+
+
+class QueueSink:
+    """Puts (key, progress) on a queue, for reporters running in a worker process.
+
+    The queue has to be picklable to reach the worker, e.g. a multiprocessing.Manager queue.
+    """
+
+    def __init__(self, queue, key):
+        self.queue = queue
+        self.key = key
+
+    def __call__(self, progress):
+        self.queue.put((self.key, progress))
@@ -0,0 +1,117 @@
+import math
+
+import numpy as np
+
+
+def kll_rank_error(k):
+    """Normalized rank error of a KLL sketch with parameter k (99% confidence).
+
+    Empirical fit published with Apache DataSketches' KLL implementation; k=200 gives ~1.33%,
+    i.e. a reported 25th percentile is the true value at some rank between 23.67% and 26.33%.
+    """
+    return 2.296 / k ** 0.9723
+
+
+class KLLSketch:
+    """Mergeable quantile sketch (Karnin, Lang, Liberty 2016).
+
+    Items live in levels; an item on level h stands for 2**h input values. When the sketch
+    outgrows its capacity a level is sorted and every other item (random offset) moves up a
+    level. Memory stays around 3k items no matter how many values are added, and sketches
+    built on different chunks or processes merge into one with the same error bound.
+    """
+
+    def __init__(self, k=200, seed=0):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def rank_error(self):
+        return kll_rank_error(self.k)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if not values.size:
+            return
+        self.count += values.size
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def update_repeated(self, value, times):
+        # binary decomposition of the weight: one item per set bit, exact and O(log times)
+        times = int(times)
+        if times <= 0 or np.isnan(value):
+            return
+        self.count += times
+        level = 0
+        while times:
+            if times & 1:
+                self._ensure_levels(level + 1)
+                self.levels[level] = np.append(self.levels[level], value)
+            times >>= 1
+            level += 1
+        self._compress()
+
+    def merge(self, other):
+        self._ensure_levels(len(other.levels))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self._compress()
+        return self
+
+    def _ensure_levels(self, n):
+        while len(self.levels) < n:
+            self.levels.append(np.empty(0))
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(8, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        while True:
+            over = [h for h in range(len(self.levels)) if len(self.levels[h]) > self._capacity(h)]
+            if not over:
+                return
+            h = over[0]
+            self._ensure_levels(h + 2)
+
+            items = np.sort(self.levels[h])
+            # an odd item out stays behind so every promoted item has a partner
+            keep = items[:1] if len(items) % 2 else items[:0]
+            items = items[len(keep):]
+            promoted = items[self.rng.integers(2)::2]
+
+            self.levels[h] = keep
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+
+    def weighted_items(self):
+        """Sorted items and the number of input values each one stands for."""
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantile(self, q):
+        if not self.count:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        items, weights = self.weighted_items()
+        cumulative = np.cumsum(weights)
+        ranks = np.asarray(q, dtype=float) * cumulative[-1]
+        index = np.searchsorted(cumulative, ranks, side='left')
+        return items[np.minimum(index, len(items) - 1)]
+
+    def cdf(self, x, inclusive=False):
+        """Estimated fraction of values below x (or at most x when inclusive)."""
+        if not self.count:
+            return np.nan
+        items, weights = self.weighted_items()
+        side = 'right' if inclusive else 'left'
+        below = weights[:np.searchsorted(items, x, side=side)].sum()
+        return below / weights.sum()
+
+    def __len__(self):
+        return sum(len(level) for level in self.levels)
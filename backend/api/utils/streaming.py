@@ -0,0 +1,421 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+from .progress import ProgressReporter
+from .sketch import KLLSketch, kll_rank_error
+
+logger = logging.getLogger(__name__)
+
+
+class RowReservoir:
+    """Uniform sample of at most `size` rows, kept by giving every row a random key
+    and retaining the smallest keys. Two reservoirs over disjoint rows can be merged."""
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.frame = None
+        self.keys = np.empty(0)
+
+    def add(self, chunk):
+        keys = self.rng.random(len(chunk))
+        if self.frame is not None and len(self.keys) >= self.size:
+            # only rows that would displace something need to be looked at
+            keep = keys < self.keys.max()
+            chunk, keys = chunk[keep], keys[keep]
+            if not len(chunk):
+                return
+
+        frame = chunk if self.frame is None else pd.concat([self.frame, chunk])
+        keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.size:
+            smallest = np.argpartition(keys, self.size - 1)[:self.size]
+            frame, keys = frame.iloc[smallest], keys[smallest]
+        self.frame, self.keys = frame, keys
+
+    def sample(self):
+        return self.frame.sort_index() if self.frame is not None else pd.DataFrame()
+
+
+class Moments:
+    """Per-column count, mean, M2 (Welford/Chan), min and max, merged chunk by chunk."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        width = len(self.columns)
+        self.count = np.zeros(width)
+        self.mean = np.zeros(width)
+        self.m2 = np.zeros(width)
+        self.min = np.full(width, np.inf)
+        self.max = np.full(width, -np.inf)
+
+    def add(self, values):
+        # values: 2D float array without NaN, one column per entry in self.columns
+        n_b = values.shape[0]
+        if not n_b:
+            return
+        mean_b = values.mean(axis=0)
+        m2_b = ((values - mean_b) ** 2).sum(axis=0)
+        self.merge(n_b, mean_b, m2_b, values.min(axis=0), values.max(axis=0))
+
+    def merge(self, n_b, mean_b, m2_b, min_b, max_b):
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean = self.mean + delta * n_b / n
+        self.m2 = self.m2 + m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+        self.min = np.minimum(self.min, min_b)
+        self.max = np.maximum(self.max, max_b)
+
+    def std(self):
+        # sample standard deviation, like describe()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.sqrt(self.m2 / (self.count - 1))
+
+
+class CrossProducts:
+    """Running sums of X and XᵀX around a fixed shift, enough for an exact Pearson matrix."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.shift = None
+        self.count = 0
+        self.sums = np.zeros(len(self.columns))
+        self.products = np.zeros((len(self.columns), len(self.columns)))
+
+    def add(self, values):
+        if not values.shape[0]:
+            return
+        if self.shift is None:
+            # centring on the first chunk keeps the sums from cancelling out
+            self.shift = values.mean(axis=0)
+        centred = values - self.shift
+        self.count += values.shape[0]
+        self.sums += centred.sum(axis=0)
+        self.products += centred.T @ centred
+
+    def corr(self):
+        mean = self.sums / self.count
+        cov = self.products / self.count - np.outer(mean, mean)
+        std = np.sqrt(np.diag(cov))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = np.clip(cov / np.outer(std, std), -1.0, 1.0)
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+
+class ParquetChunkWriter:
+    """Appends cleaned chunks to one Parquet file, with the schema of the first chunk.
+
+    Writing is a by-product of the analysis: on any error the partial file is removed and
+    later chunks are ignored. Needs pyarrow.
+    """
+
+    def __init__(self, path, string_columns=()):
+        self.path = path
+        self.string_columns = list(string_columns)
+        self.writer = None
+        self.failed = False
+
+    def write(self, chunk):
+        if self.failed:
+            return
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        try:
+            # a text column can come out numeric in a chunk where it happens to hold only numbers
+            mixed = [c for c in self.string_columns if chunk[c].dtype != object]
+            if mixed:
+                chunk = chunk.assign(**{c: chunk[c].astype(str) for c in mixed})
+
+            if self.writer is None:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                self.writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+            self.writer.write_table(table)
+        except Exception:
+            logger.warning(f"Could not write the cleaned data to {self.path}", exc_info=True)
+            self.failed = True
+            self.close()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.failed and os.path.exists(self.path):
+            os.remove(self.path)
+
+    @property
+    def written(self):
+        return None if self.failed or not os.path.exists(self.path) else self.path
+
+
+class StreamingCSVProcessor:
+    """Produces the same stats as CSVProcessor while holding only one chunk at a time.
+
+    The first pass finds the numeric columns and feeds a KLL sketch per column, which gives
+    the imputation medians and the IQR bounds. The second pass cleans and caps each chunk and
+    accumulates mergeable aggregates; quantiles in the describe() table come from sketches of
+    the cleaned values and are accurate to `kll_rank_error(sketch_k)` in rank.
+
+    With `one_pass=True` the second pass is skipped: outlier counts are read off the sketch
+    CDF, describe() moments come from the clipped sketch items, and per-Type averages are
+    computed from the imputed but uncapped values.
+    """
+
+    def __init__(self, file_path, chunksize=200_000, sample_rows=100_000, sketch_k=200, seed=0, progress=None):
+        self.file_path = file_path
+        self.chunksize = chunksize
+        self.sample_rows = sample_rows
+        self.sketch_k = sketch_k
+        self.seed = seed
+        self.progress = progress or ProgressReporter()
+        self.size = os.path.getsize(file_path)
+        self.bytes_read = 0
+
+    def chunks(self):
+        with open(self.file_path, 'rb') as handle:
+            for chunk in pd.read_csv(handle, chunksize=self.chunksize):
+                # the parser reads ahead in blocks, close enough for progress
+                self.bytes_read = handle.tell()
+                yield chunk
+
+    def scan(self, one_pass=False):
+        # pass 1: column types, raw sketches and null counts; per-Type sums for one_pass
+        columns, numeric = None, None
+        sketches, nulls, minima, maxima = {}, {}, {}, {}
+        reservoir = RowReservoir(self.sample_rows, self.seed)
+        type_counts = pd.Series(dtype='int64')
+        type_sums, type_present = None, None
+        total_rows = 0
+
+        for chunk in self.chunks():
+            total_rows += len(chunk)
+            self.progress.update("reading", self.bytes_read, self.size, rows=total_rows)
+            chunk_numeric = set(chunk.select_dtypes(include=[np.number]).columns)
+            if columns is None:
+                columns = chunk.columns.tolist()
+                numeric = chunk_numeric
+            else:
+                numeric &= chunk_numeric
+            num = [c for c in columns if c in numeric]
+
+            for col in num:
+                values = chunk[col].to_numpy(dtype=float)
+                sketch = sketches.setdefault(col, KLLSketch(self.sketch_k, self.seed))
+                sketch.update(values)
+                present = values[~np.isnan(values)]
+                nulls[col] = nulls.get(col, 0) + len(values) - len(present)
+                if present.size:
+                    minima[col] = min(minima.get(col, np.inf), present.min())
+                    maxima[col] = max(maxima.get(col, -np.inf), present.max())
+
+            if one_pass:
+                reservoir.add(chunk)
+                if "Type" in chunk.columns:
+                    types = chunk["Type"].fillna("Unknown")
+                    type_counts = type_counts.add(types.value_counts(), fill_value=0)
+                    grouped = chunk[num].groupby(types)
+                    sums, present = grouped.sum(), grouped.count()
+                    type_sums = sums if type_sums is None else type_sums.add(sums, fill_value=0)
+                    type_present = present if type_present is None else type_present.add(present, fill_value=0)
+
+        if columns is None:
+            raise pd.errors.EmptyDataError("No columns to parse from file")
+
+        self.columns = columns
+        self.numeric_cols = [c for c in columns if c in numeric]
+        self.categorical_cols = [c for c in columns if c not in numeric]
+        self.total_rows = total_rows
+        self.sketches = {col: sketches[col] for col in self.numeric_cols}
+        self.minima = pd.Series({col: minima.get(col, np.nan) for col in self.numeric_cols}, dtype=float)
+        self.maxima = pd.Series({col: maxima.get(col, np.nan) for col in self.numeric_cols}, dtype=float)
+
+        self.medians = pd.Series({col: self.sketches[col].quantile(0.5) for col in self.numeric_cols}, dtype=float)
+
+        # imputation adds `nulls` copies of the median, which the sketch can take exactly;
+        # the median lies inside [min, max], so those stay as they are
+        for col in self.numeric_cols:
+            self.sketches[col].update_repeated(self.medians[col], nulls[col])
+
+        q1 = pd.Series({col: self.sketches[col].quantile(0.25) for col in self.numeric_cols}, dtype=float)
+        q3 = pd.Series({col: self.sketches[col].quantile(0.75) for col in self.numeric_cols}, dtype=float)
+        iqr = q3 - q1
+
+        # same rule as CSVProcessor.handle_outliers: skip columns without spread
+        has_spread = iqr != 0
+        self.lower = (q1 - 1.5 * iqr)[has_spread]
+        self.upper = (q3 + 1.5 * iqr)[has_spread]
+
+        self.type_counts = type_counts
+        if type_sums is not None:
+            # imputed means: every missing value in a group counts as the column median
+            cols = [c for c in self.numeric_cols if c in type_sums.columns]
+            missing = type_present[cols].rsub(type_counts, axis=0)
+            self.type_sums = type_sums[cols].add(missing.mul(self.medians[cols], axis=1), fill_value=0)
+        else:
+            self.type_sums = None
+        self.raw_sample = reservoir.sample()
+
+    def clean(self, chunk, strategy):
+        # same steps as CSVProcessor.clean_data + handle_outliers, with the global medians and bounds
+        num = self.numeric_cols
+        chunk[num] = chunk[num].astype(float).fillna(self.medians)
+        cat = [c for c in self.categorical_cols if chunk[c].isnull().any()]
+        if cat:
+            chunk[cat] = chunk[cat].fillna("Unknown")
+
+        bounded = chunk[self.lower.index]
+        mask = bounded.lt(self.lower, axis=1) | bounded.gt(self.upper, axis=1)
+        if strategy == "cap" and len(self.lower):
+            chunk[self.lower.index] = bounded.clip(self.lower, self.upper, axis=1)
+        return chunk, mask.sum()
+
+    def run(self, strategy="cap", one_pass=False, parquet_path=None):
+        # parquet_path: cleaned rows are also written there; one_pass has no cleaning pass to write from
+        self.scan(one_pass=one_pass)
+        if one_pass:
+            return self.one_pass_results(strategy)
+
+        num = self.numeric_cols
+        moments = Moments(num)
+        products = CrossProducts(num)
+        sketches = [KLLSketch(self.sketch_k, self.seed + 1) for _ in num]
+        outliers = pd.Series(0, index=self.lower.index, dtype='int64')
+        type_counts = pd.Series(dtype='int64')
+        type_sums = None
+        reservoir = RowReservoir(self.sample_rows, self.seed + 1)
+        writer = ParquetChunkWriter(parquet_path, self.categorical_cols) if parquet_path else None
+
+        # pass 2: clean, cap and aggregate chunk by chunk
+        rows = 0
+        for chunk in self.chunks():
+            rows += len(chunk)
+            self.progress.update("cleaning", self.bytes_read, self.size, rows=rows)
+            chunk, chunk_outliers = self.clean(chunk, strategy)
+            outliers += chunk_outliers
+            if writer:
+                writer.write(chunk)
+
+            values = chunk[num].to_numpy(dtype=float)
+            moments.add(values)
+            products.add(values)
+            for i, sketch in enumerate(sketches):
+                sketch.update(values[:, i])
+
+            if "Type" in chunk.columns:
+                type_counts = type_counts.add(chunk["Type"].value_counts(), fill_value=0)
+                if num:
+                    sums = chunk.groupby("Type")[num].sum()
+                    type_sums = sums if type_sums is None else type_sums.add(sums, fill_value=0)
+
+            reservoir.add(chunk)
+
+        if writer:
+            writer.close()
+        self.progress.update("statistics", rows=rows)
+
+        self.outlier_counts = {col: int(n) for col, n in outliers.items() if n > 0}
+        quartiles = {col: sketch.quantile([0.25, 0.5, 0.75]) for col, sketch in zip(num, sketches)}
+
+        return reservoir.sample(), {
+            "total_rows": self.total_rows,
+            "stats": self.describe(moments.count, moments.mean, moments.std(), moments.min, moments.max, quartiles),
+            "outliers": self.outlier_counts,
+            "equip_dist": self.equip_dist(type_counts),
+            "equip_averages": self.equip_averages(type_counts, type_sums),
+            "columns": self.columns,
+            "correlation": products.corr().to_dict() if len(num) >= 2 else {},
+            "approximation": self.approximation(one_pass=False),
+            "cleaned_file": writer.written if writer else None,
+        }
+
+    def one_pass_results(self, strategy):
+        self.progress.update("statistics", rows=self.total_rows)
+        num = self.numeric_cols
+        outliers, quartiles = {}, {}
+        count, mean, std = [], [], []
+        lower = self.lower.reindex(num)
+        upper = self.upper.reindex(num)
+        cap = strategy == "cap"
+
+        for col in num:
+            sketch = self.sketches[col]
+            items, weights = sketch.weighted_items()
+            q = sketch.quantile([0.25, 0.5, 0.75])
+
+            if col in self.lower.index:
+                below = sketch.cdf(lower[col])
+                above = 1 - sketch.cdf(upper[col], inclusive=True)
+                estimate = int(round((below + above) * sketch.count))
+                if estimate > 0:
+                    outliers[col] = estimate
+                if cap:
+                    items = np.clip(items, lower[col], upper[col])
+                    q = np.clip(q, lower[col], upper[col])
+
+            total = weights.sum()
+            col_mean = (items * weights).sum() / total
+            count.append(sketch.count)
+            mean.append(col_mean)
+            std.append(np.sqrt((weights * (items - col_mean) ** 2).sum() / max(total - 1, 1)))
+            quartiles[col] = q
+
+        minima, maxima = self.minima, self.maxima
+        if cap:
+            minima = minima.clip(lower=lower.fillna(-np.inf), upper=upper.fillna(np.inf))
+            maxima = maxima.clip(lower=lower.fillna(-np.inf), upper=upper.fillna(np.inf))
+
+        sample, _ = self.clean(self.raw_sample, strategy) if len(self.raw_sample) else (self.raw_sample, None)
+        numeric_sample = sample[num] if len(sample) else pd.DataFrame(columns=num)
+        self.outlier_counts = outliers
+
+        return sample, {
+            "total_rows": self.total_rows,
+            "stats": self.describe(np.array(count, dtype=float), np.array(mean), np.array(std), minima.to_numpy(), maxima.to_numpy(), quartiles),
+            "outliers": outliers,
+            "equip_dist": self.equip_dist(self.type_counts),
+            "equip_averages": self.equip_averages(self.type_counts, self.type_sums),
+            "columns": self.columns,
+            "correlation": numeric_sample.corr().to_dict() if len(num) >= 2 else {},
+            "approximation": self.approximation(one_pass=True),
+        }
+
+    def approximation(self, one_pass):
+        return {
+            "quantiles": "kll",
+            "rank_error": round(kll_rank_error(self.sketch_k), 4),
+            "one_pass": one_pass,
+        }
+
+    def describe(self, count, mean, std, minimum, maximum, quartiles):
+        # same layout as DataFrame.describe().round(2).to_dict()
+        if not self.numeric_cols:
+            return {}
+        q = np.array([quartiles[col] for col in self.numeric_cols], dtype=float)
+        table = pd.DataFrame({
+            "count": count,
+            "mean": mean,
+            "std": std,
+            "min": minimum,
+            "25%": q[:, 0],
+            "50%": q[:, 1],
+            "75%": q[:, 2],
+            "max": maximum,
+        }, index=self.numeric_cols).T
+        return table.round(2).to_dict()
+
+    def equip_dist(self, type_counts):
+        if "Type" not in self.columns:
+            return {}
+        return type_counts.astype('int64').sort_values(ascending=False, kind='stable').to_dict()
+
+    def equip_averages(self, type_counts, type_sums):
+        if "Type" not in self.columns or type_sums is None:
+            return {}
+        averages = type_sums.div(type_counts.reindex(type_sums.index), axis=0).sort_index().round(2)
+        return averages.to_dict(orient='index')
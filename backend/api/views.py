@@ -1,17 +1,39 @@
+import asyncio
 import logging
 import json
-from django.http import FileResponse, JsonResponse
+import mimetypes
+import os
+import time
+import zlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.urls import reverse
+from django.views import View
 
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from .charts import (
+    chart_data, chart_dir, chart_profile, chart_rendition, chart_variant, chart_version, dataset_charts, image_size,
+    specs_version,
+)
+from .files import file_etag, serve_file
+from .metrics import BYTES_INGESTED, CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY
 from .models import Dataset
+from .reports import ReportNotReady, ensure_report
 from .serializers import DatasetSerializer
-from .tasks import start_processing_thread
+from .tasks import QueueFull, enqueue_dataset, queue_is_full
+from .utils.chart import SPECS_NAME
 
 logger = logging.getLogger(__name__)
 
@@ -24,9 +46,23 @@ class DatasetUpload(APIView):
         if not serializer.is_valid():
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-        dataset = serializer.save(user=request.user, status='pending')
+        if queue_is_full():
+            return self.queue_full_response()
 
-        start_processing_thread(dataset.id)
+        dataset = serializer.save(
+            user=request.user,
+            status='pending',
+            content_hash=getattr(request, 'upload_hashes', {}).get('dataset_file')
+        )
+
+        try:
+            enqueue_dataset(dataset.id)
+        except QueueFull:
+            dataset.dataset_file.delete(save=False)
+            dataset.delete()
+            return self.queue_full_response()
+
+        BYTES_INGESTED.inc(dataset.dataset_file.size)
 
         return Response({
             "message": "File uploaded successfully. Analysis is in progress.",
@@ -34,6 +70,52 @@ class DatasetUpload(APIView):
             "status": "pending"
         }, status=status.HTTP_202_ACCEPTED)
 
+    def queue_full_response(self):
+        return Response(
+            {"error": "Server is busy processing other datasets. Please try again shortly."},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "30"}
+        )
+
+
+FINAL_STATUSES = ('completed', 'failed')
+
+
+def status_version(status, progress):
+    # changes whenever the status or progress does; clients send it back as `since`
+    return f"{zlib.crc32(f'{status}|{progress}'.encode()):08x}"
+
+
+def status_payload(dataset):
+    response_data = {
+        "dataset_id": dataset.id,
+        "status": dataset.status,
+        "uploaded_at": dataset.uploaded_at,
+        "version": status_version(dataset.status, dataset.progress)
+    }
+
+    if dataset.progress:
+        response_data['progress'] = json.loads(dataset.progress)
+
+    if dataset.status == 'failed':
+        response_data['error'] = dataset.error_log
+
+    if dataset.status == 'completed':
+        # False until the report is built, see PDF_REPORT_MODE; DownloadPDF builds it if needed
+        response_data['pdf_ready'] = bool(dataset.pdf_file)
+
+    if dataset.status == 'completed' and dataset.analysis_results:
+        try:
+            # stored with NaN where pandas gave one (the std of a single row), which is no JSON for clients
+            response_data['analysis'] = json.loads(dataset.analysis_results, parse_constant=lambda _: None)
+        except json.JSONDecodeError:
+            logger.error(f"Failed to parse analysis results for dataset {dataset.id}")
+
+    if dataset.timings:
+        response_data['timings'] = json.loads(dataset.timings)
+
+    return response_data
+
 
 class DatasetStatus(APIView):
     """Check dataset processing status and get analysis results"""
@@ -41,23 +123,118 @@ class DatasetStatus(APIView):
 
     def get(self, request, dataset_id):
         dataset = get_object_or_404(Dataset, id=dataset_id, user=request.user)
-        
-        response_data = {
-            "dataset_id": dataset.id,
-            "status": dataset.status,
-            "uploaded_at": dataset.uploaded_at
-        }
-        
-        if dataset.status == 'failed':
-            response_data['error'] = dataset.error_log
-        
-        if dataset.status == 'completed' and dataset.analysis_results:
+        return Response(status_payload(dataset))
+
+
+async def wait_for_change(dataset_id, since, timeout):
+    """The dataset once its status version differs from `since`, it is finished or `timeout` passes.
+
+    Checks one indexed row every STATUS_STREAM_INTERVAL and loads the whole dataset only
+    when it returns. None if the dataset was deleted meanwhile.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        row = await Dataset.objects.filter(id=dataset_id).values_list('status', 'progress').afirst()
+        if row is None:
+            return None
+
+        remaining = deadline - time.monotonic()
+        if status_version(*row) != since or row[0] in FINAL_STATUSES or remaining <= 0:
+            return await Dataset.objects.filter(id=dataset_id).afirst()
+        await asyncio.sleep(min(settings.STATUS_STREAM_INTERVAL, remaining))
+
+
+def _sse(payload):
+    data = json.dumps(payload, cls=DjangoJSONEncoder)
+    return f"id: {payload['version']}\nevent: status\ndata: {data}\n\n"
+
+
+def _jwt_user(request):
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return authenticated[0] if authenticated else None
+
+
+class DatasetStatusStream(View):
+    """Pushes status and progress changes of one dataset instead of clients polling DatasetStatus.
+
+    By default a server-sent event stream: a `status` event (DatasetStatus' payload) right
+    away and on every change, closed after the completed/failed one. With
+    `?wait=<seconds>&since=<version>` it long-polls instead and answers once the version
+    differs from `since`. Open streams only cost a coroutine when served by backend.asgi;
+    under WSGI (runserver) both answer with the current state right away and tell the client
+    to come back after STATUS_WSGI_RETRY seconds, a held request would block a worker thread.
+    """
+
+    async def get(self, request, dataset_id):
+        user = await sync_to_async(_jwt_user)(request)
+        if user is None:
+            return JsonResponse(
+                {"detail": "Authentication credentials were not provided or are invalid."},
+                status=status.HTTP_401_UNAUTHORIZED,
+                headers={"WWW-Authenticate": 'Bearer realm="api"'}
+            )
+
+        if not await Dataset.objects.filter(id=dataset_id, user=user).aexists():
+            return JsonResponse({"error": "Dataset not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        since = request.headers.get('Last-Event-ID') or request.GET.get('since')
+        asgi = isinstance(request, ASGIRequest)
+
+        if 'wait' in request.GET:
             try:
-                response_data['analysis'] = json.loads(dataset.analysis_results)
-            except json.JSONDecodeError:
-                logger.error(f"Failed to parse analysis results for dataset {dataset_id}")
-        
-        return Response(response_data)
+                wait = min(max(float(request.GET['wait']), 0), settings.STATUS_LONG_POLL_MAX_WAIT)
+            except ValueError:
+                return JsonResponse({"error": "wait must be a number of seconds"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # a WSGI worker would be blocked for the whole wait, plain polling then
+            dataset = await wait_for_change(dataset_id, since, wait if asgi else 0)
+            if dataset is None:
+                return JsonResponse({"error": "Dataset not found"}, status=status.HTTP_404_NOT_FOUND)
+            response = JsonResponse(status_payload(dataset), encoder=DjangoJSONEncoder)
+            if not asgi:
+                response['Retry-After'] = str(settings.STATUS_WSGI_RETRY)
+            return response
+
+        if asgi:
+            events = self.events(dataset_id, since)
+        else:
+            # a WSGI worker would be blocked for the whole stream
+            dataset = await Dataset.objects.aget(id=dataset_id)
+            retry = int(settings.STATUS_WSGI_RETRY * 1000)
+            events = [f"retry: {retry}\n\n", _sse(status_payload(dataset))]
+
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response['Cache-Control'] = 'no-cache'
+        # nginx would otherwise buffer the events
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    async def events(self, dataset_id, since):
+        deadline = time.monotonic() + settings.STATUS_STREAM_TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                # EventSource reconnects with Last-Event-ID and carries on from there
+                return
+
+            dataset = await wait_for_change(dataset_id, since, min(remaining, settings.STATUS_STREAM_KEEPALIVE))
+            if dataset is None:
+                return
+
+            payload = status_payload(dataset)
+            finished = dataset.status in FINAL_STATUSES
+            if payload['version'] != since or finished:
+                since = payload['version']
+                yield _sse(payload)
+            else:
+                # comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+
+            if finished:
+                return
 
 
 class UserDatasetList(ListAPIView):
@@ -85,19 +262,177 @@ class DownloadPDF(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         if not dataset.pdf_file:
-            return Response({
-                "error": "No PDF available",
-                "dataset_id": dataset_id
-            }, status=status.HTTP_404_NOT_FOUND)
+            # first download builds the report; while it is built elsewhere the client comes back later
+            try:
+                ensure_report(dataset)
+            except ReportNotReady:
+                return Response(
+                    {"message": "Report is still being generated. Please try again shortly.", "dataset_id": dataset_id},
+                    status=status.HTTP_202_ACCEPTED,
+                    headers={"Retry-After": str(settings.PDF_BUILD_RETRY_AFTER)}
+                )
+            except Exception:
+                logger.exception(f"Could not build the report of dataset {dataset_id}")
+                return Response({
+                    "error": "No PDF available",
+                    "dataset_id": dataset_id
+                }, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            return FileResponse(
-                dataset.pdf_file.open('rb'),
-                as_attachment=True,
-                filename=f"pdf_report_{dataset.id}.pdf"
+            return serve_file(
+                request,
+                dataset.pdf_file.path,
+                filename=f"pdf_report_{dataset.id}.pdf",
+                content_type='application/pdf'
             )
         except FileNotFoundError:
             return Response({
                 "error": "PDF file not found",
                 "dataset_id": dataset_id
-            }, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+            }, status=status.HTTP_404_NOT_FOUND)
+
+
+class DatasetCharts(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, dataset_id):
+        dataset = get_object_or_404(Dataset, id=dataset_id, user=request.user)
+
+        pending_version = specs_version(dataset.id)
+        charts = []
+        for path in dataset_charts(dataset):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None:
+                size, version = stat.st_size, chart_version(stat)
+                try:
+                    width, height = image_size(path)
+                except OSError:
+                    # vector display profile
+                    width = height = None
+            elif pending_version is not None:
+                # not rendered yet with CHART_RENDER_MODE = "client", the image request renders it
+                size = width = height = None
+                version = pending_version
+            else:
+                continue
+            name = os.path.basename(path)
+            # the version in the URL lets clients cache each chart for good
+            url = request.build_absolute_uri(f"{reverse('dataset_chart', args=[dataset.id, name])}?v={version}")
+            charts.append({
+                "name": name,
+                "url": url,
+                "content_type": mimetypes.guess_type(path)[0],
+                "size": size,
+                "version": version,
+                "width": width,
+                "height": height,
+                "rendered": stat is not None,
+                # other renderings of the same chart, made on first request
+                "renditions": {
+                    profile: f"{url}&profile={profile}"
+                    for profile in settings.CHART_PROFILES if profile != settings.CHART_DISPLAY_PROFILE
+                },
+            })
+
+        return Response({
+            "dataset_id": dataset.id,
+            "charts": charts,
+            "widths": list(settings.CHART_VARIANT_WIDTHS),
+            "profiles": list(settings.CHART_PROFILES),
+        })
+
+
+class DatasetChartData(APIView):
+    """The data behind each chart as column arrays, for clients that draw the charts themselves"""
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, dataset_id):
+        dataset = get_object_or_404(Dataset, id=dataset_id, user=request.user)
+
+        if dataset.status != 'completed':
+            return Response(
+                {"error": f"Charts not ready. Current status is {dataset.status}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        max_points = request.GET.get('max_points')
+        try:
+            max_points = int(max_points) if max_points else None
+        except ValueError:
+            max_points = -1
+        if max_points is not None and max_points < 0:
+            return Response({"error": "max_points must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            etag = file_etag(os.stat(os.path.join(chart_dir(dataset.id), SPECS_NAME)))
+        except FileNotFoundError:
+            # analysed before the chart specs were kept
+            return Response({"error": "Chart data is not available for this dataset"}, status=status.HTTP_404_NOT_FOUND)
+
+        # the specs only change when the dataset is analysed again
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response({"dataset_id": dataset.id, "charts": chart_data(dataset, max_points)})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+class DatasetChart(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, dataset_id, name):
+        dataset = get_object_or_404(Dataset, id=dataset_id, user=request.user)
+
+        # only names from the dataset's own chart list, never a path from the URL
+        path = next((p for p in dataset_charts(dataset) if os.path.basename(p) == name), None)
+        if path is None:
+            return Response({"error": "Chart not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        width = request.GET.get('width')
+        try:
+            width = int(width) if width else None
+        except ValueError:
+            width = 0
+        if width is not None and width <= 0:
+            return Response({"error": "width must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        profile = request.GET.get('profile')
+        if profile is not None and profile not in settings.CHART_PROFILES:
+            return Response(
+                {"error": f"Unknown profile {profile}. Available: {', '.join(settings.CHART_PROFILES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if profile is not None and width:
+            return Response({"error": "width applies to the display charts only"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            path = chart_rendition(dataset, path, chart_profile(settings.CHART_DISPLAY_PROFILE))
+            # listed before it was rendered, under the version of its specs
+            versions = {chart_version(os.stat(path)), specs_version(dataset.id)}
+            if profile is not None:
+                served = chart_rendition(dataset, path, chart_profile(profile))
+            else:
+                served = chart_variant(path, width) if width else path
+            # a URL carrying the current version never changes content
+            if request.GET.get('v') in versions - {None}:
+                cache_control = 'private, max-age=31536000, immutable'
+            else:
+                cache_control = 'private, no-cache'
+            return serve_file(request, served, filename=os.path.basename(served), as_attachment=False,
+                              content_type=mimetypes.guess_type(served)[0], cache_control=cache_control)
+        except FileNotFoundError:
+            return Response({"error": "Chart not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+class Metrics(View):
+    """Prometheus text exposition of this web process' metrics, for a local collector"""
+
+    def get(self, request):
+        if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+            return HttpResponseForbidden()
+        return HttpResponse(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
@@ -0,0 +1,265 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# imported once by the forkserver so every worker starts with them already loaded
+PRELOAD_MODULES = ['numpy', 'pandas', 'matplotlib', 'seaborn', 'reportlab.platypus', 'api.utils']
+
+
+def _init_worker():
+    # Ctrl+C reaches the whole process group; the dispatcher handles it and lets running jobs finish
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # no-op under forkserver, does the heavy imports up front under spawn
+    import api.utils  # noqa: F401
+
+
+def _mp_context():
+    method = settings.PROCESSING_START_METHOD
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+
+    # workers never render to a screen
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+
+    context = multiprocessing.get_context(method)
+    if method == 'forkserver':
+        context.set_forkserver_preload(PRELOAD_MODULES)
+    return context
+
+
+class JobDispatcher:
+    """Claims queued jobs and runs at most `workers` of them at a time in a process pool.
+
+    Database work and result cache lookups stay in this process; the pool only runs
+    `analyze_dataset`, which gets file paths and returns the analysis results, and
+    `pdf_report` for report jobs.
+    """
+
+    def __init__(self, workers=None, poll_interval=None, metrics_port=None):
+        self.workers = workers or settings.PROCESSING_WORKERS
+        self.poll_interval = poll_interval or settings.PROCESSING_POLL_INTERVAL
+        self.metrics_port = metrics_port or settings.PROCESSING_METRICS_PORT
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+        self.in_flight = {}
+        self.last_heartbeat = 0
+        self.last_requeue = None
+        # progress of the running analyses, sent by the pool workers
+        self.progress = None
+        self._stopping = False
+
+    def stop(self, *args):
+        if not self._stopping:
+            logger.info("Shutting down after the running jobs finish")
+        self._stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        if self.metrics_port:
+            metrics.start_http_server(self.metrics_port)
+
+        manager = _mp_context().Manager()
+        self.progress = manager.Queue()
+        pool = self._start_pool()
+        logger.info(f"Dispatcher {self.name} started with {self.workers} workers")
+
+        try:
+            while not self._stopping or self.in_flight:
+                if not self._stopping:
+                    # before claiming, so the jobs of a dispatcher that died are picked up again
+                    self._requeue_stale()
+                    self._fill(pool)
+                metrics.JOBS_IN_FLIGHT.set(len(self.in_flight))
+
+                if not self.in_flight:
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, _ = wait(self.in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                self._save_progress()
+                self._heartbeat()
+                broken = False
+                for future in done:
+                    broken = self._complete(future) or broken
+
+                if broken:
+                    # a child died (e.g. OOM killed); every pending future is lost with the pool
+                    for future in list(self.in_flight):
+                        self._complete(future)
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    pool = self._start_pool()
+        finally:
+            pool.shutdown(wait=True)
+            manager.shutdown()
+
+    def _start_pool(self):
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_mp_context(),
+            initializer=_init_worker
+        )
+
+    def _fill(self, pool):
+        from .tasks import claim_next_job, complete_from_cache, fail_dataset, finish_job, prepare_dataset
+        from .utils import analyze_dataset
+        from .utils.progress import QueueSink
+
+        # only claim what the pool can start right away, the rest stays queued in the db
+        while len(self.in_flight) < self.workers:
+            job = claim_next_job(self.name)
+            if job is None:
+                return
+
+            if job.kind == 'report':
+                self._start_report(pool, job)
+                continue
+
+            try:
+                job_args = prepare_dataset(job.dataset_id)
+                cached = complete_from_cache(job.dataset_id, job_args)
+            except Exception as e:
+                logger.exception(f"Could not start job {job.id}")
+                fail_dataset(job.dataset_id, e)
+                finish_job(job, succeeded=False)
+                continue
+
+            if cached:
+                finish_job(job, succeeded=True)
+                continue
+
+            logger.info(f"Starting job {job.id} for Dataset ID: {job.dataset_id}")
+            future = pool.submit(analyze_dataset, **job_args, on_progress=QueueSink(self.progress, job.dataset_id))
+            self.in_flight[future] = (job, job_args)
+
+    def _start_report(self, pool, job):
+        from .models import Dataset
+        from .reports import claim_build, finish_build, report_args
+        from .tasks import finish_job
+        from .utils import pdf_report
+
+        # a download may have built the report already, or be building it right now
+        if not claim_build(job.dataset_id):
+            finish_job(job, succeeded=True)
+            return
+
+        try:
+            args = report_args(Dataset.objects.get(id=job.dataset_id))
+        except Exception:
+            logger.exception(f"Could not start report job {job.id}")
+            finish_build(job.dataset_id)
+            finish_job(job, succeeded=False)
+            return
+
+        logger.info(f"Starting report job {job.id} for Dataset ID: {job.dataset_id}")
+        future = pool.submit(pdf_report, **args)
+        self.in_flight[future] = (job, args)
+
+    def _heartbeat(self):
+        from .reports import heartbeat_builds
+        from .tasks import heartbeat_jobs
+
+        # keeps other dispatchers (and this one after a restart) from taking long jobs for lost ones
+        if time.monotonic() - self.last_heartbeat < settings.PROCESSING_HEARTBEAT_INTERVAL:
+            return
+        try:
+            heartbeat_jobs([job.id for job, _ in self.in_flight.values()])
+            # and the reports being built keep their claim, see reports.claim_build
+            heartbeat_builds([job.dataset_id for job, _ in self.in_flight.values() if job.kind == 'report'])
+        except Exception:
+            logger.warning("Could not refresh the heartbeat of the running jobs", exc_info=True)
+            return
+        self.last_heartbeat = time.monotonic()
+
+    def _requeue_stale(self):
+        from .tasks import requeue_stale_jobs
+
+        # on a timer, not only at startup: another dispatcher may die while this one keeps running
+        due = self.last_requeue is None or time.monotonic() - self.last_requeue >= settings.PROCESSING_HEARTBEAT_INTERVAL
+        if not due:
+            return
+        self.last_requeue = time.monotonic()
+        try:
+            requeued = requeue_stale_jobs()
+        except Exception:
+            logger.warning("Could not requeue stale jobs", exc_info=True)
+            return
+        if requeued:
+            logger.info(f"Requeued {requeued} stale jobs")
+
+    def _save_progress(self):
+        from .tasks import set_progress
+
+        # one write per dataset per loop, however many updates the workers sent meanwhile
+        latest = {}
+        while True:
+            try:
+                dataset_id, progress = self.progress.get_nowait()
+            except queue.Empty:
+                break
+            latest[dataset_id] = progress
+
+        for dataset_id, progress in latest.items():
+            try:
+                set_progress(dataset_id, **progress)
+            except Exception:
+                logger.warning(f"Could not save progress of dataset {dataset_id}", exc_info=True)
+
+    def _complete(self, future):
+        from .reports import finish_build
+        from .tasks import cache_results, complete_dataset, fail_dataset, finish_job, retry_or_fail_job
+
+        job, job_args = self.in_flight.pop(future)
+        if not future.done():
+            retry_or_fail_job(job, "Worker pool was restarted")
+            return False
+
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            logger.error(f"Worker process died while running job {job.id}")
+            retry_or_fail_job(job, e)
+            return True
+        except Exception as e:
+            # raised by the pipeline itself, retrying would fail the same way
+            if job.kind == 'report':
+                logger.error(f"Failed to build the report of dataset {job.dataset_id}: {e!r}")
+                finish_build(job.dataset_id)
+            else:
+                logger.error(f"Failed to process dataset {job.dataset_id}: {e!r}")
+                fail_dataset(job.dataset_id, e)
+            finish_job(job, succeeded=False)
+            return False
+
+        if job.kind == 'report':
+            # result is the written report
+            finish_build(job.dataset_id, result)
+            finish_job(job, succeeded=True)
+            logger.info(f"Job {job.id} finished")
+            return False
+
+        try:
+            complete_dataset(job.dataset_id, result)
+        except Exception as e:
+            logger.exception(f"Could not save results for dataset {job.dataset_id}")
+            fail_dataset(job.dataset_id, e)
+            finish_job(job, succeeded=False)
+            return False
+
+        cache_results(job.dataset_id, job_args, result)
+        finish_job(job, succeeded=True)
+        logger.info(f"Job {job.id} finished")
+        return False
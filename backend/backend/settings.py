@@ -50,6 +50,9 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "api.middleware.RequestMetricsMiddleware",
+    # for clients that send Accept-Encoding: gzip, e.g. the desktop app over slow links
+    "api.middleware.JSONGZipMiddleware",
     "corsheaders.middleware.CorsMiddleware",  
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -140,6 +143,8 @@ CORS_ALLOW_ALL_ORIGINS = True  # For development only
 #     "https://your-frontend-domain.com",
 # ]
 CORS_ALLOW_CREDENTIALS = True
+# read by the web client to know when to ask again (status polling under WSGI, reports being built)
+CORS_EXPOSE_HEADERS = ["Retry-After"]
 
 # CSV uploads
 MEDIA_URL = "/media/"
@@ -147,6 +152,11 @@ MEDIA_ROOT = BASE_DIR / "media"
 
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 20 * 1024 * 1024  # 20MB
+FILE_UPLOAD_HANDLERS = [
+    "api.uploadhandlers.HashingUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
 
 # Django REST Framework authentication
 REST_FRAMEWORK = {
@@ -190,4 +200,102 @@ LOGGING = {
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+# Dataset processing queue, consumed by `python manage.py process_jobs`
+PROCESSING_WORKERS = 2
+PROCESSING_QUEUE_MAX_DEPTH = 50  # uploads are rejected with 503 above this many waiting jobs
+PROCESSING_POLL_INTERVAL = 1.0  # seconds
+# dispatchers refresh the heartbeat of their running jobs every PROCESSING_HEARTBEAT_INTERVAL seconds;
+# a running job without one for PROCESSING_JOB_TIMEOUT seconds belongs to a dispatcher that is gone,
+# and every dispatcher checks for such jobs as often as it refreshes its own
+PROCESSING_HEARTBEAT_INTERVAL = 30
+PROCESSING_JOB_TIMEOUT = 5 * 60
+PROCESSING_MAX_ATTEMPTS = 3
+# how the pool starts worker processes; falls back to spawn where forkserver is unavailable
+PROCESSING_START_METHOD = "forkserver"
+# processes each job uses to render its charts in parallel (1 renders inline)
+CHART_RENDER_WORKERS = 4
+
+# Options passed to the analysis pipeline; part of the result cache key
+ANALYSIS_OPTIONS = {
+    "outlier_strategy": "cap",
+    # larger CSVs are processed in chunks with bounded memory
+    "streaming_threshold_bytes": 256 * 1024 * 1024,
+    # "exact" or "sketch" (KLL, ~1.3% rank error) quantiles for in-memory files;
+    # streamed files always use sketches
+    "quantiles": "exact",
+    # streamed files only: estimate outliers from the first pass instead of reading the file twice
+    "approximate_outliers": False,
+    # categoricals and narrow numeric dtypes for in-memory files; values are unchanged
+    "optimize_dtypes": True,
+    # Arrow-backed strings for high-cardinality text columns, needs pyarrow
+    "arrow_strings": False,
+    # "auto" uses the multithreaded Arrow CSV reader when pyarrow is installed, else "c"
+    "csv_engine": "auto",
+    # "pairwise" (DataFrame.corr), or one BLAS product in "float64" / "float32" for wide data
+    "correlation": "pairwise",
+}
+
+# dispatcher metrics are served on 127.0.0.1:<port>/metrics when set, see `process_jobs --metrics-port`
+PROCESSING_METRICS_PORT = None
+
+# dataset-status/<id>/stream/: how often open streams check their dataset for changes, how long
+# an event stream stays open before the client reconnects, and the longest long-poll wait
+STATUS_STREAM_INTERVAL = 1.0  # seconds
+STATUS_STREAM_TIMEOUT = 5 * 60
+STATUS_STREAM_KEEPALIVE = 15
+STATUS_LONG_POLL_MAX_WAIT = 30
+# under WSGI nothing is held open: streams and long-polls answer at once, and clients are told
+# (SSE retry / Retry-After) to come back after this many seconds
+STATUS_WSGI_RETRY = 5
+
+# clients allowed to scrape /api/metrics/
+METRICS_ALLOWED_IPS = ["127.0.0.1", "::1"]
+
+# When the PDF report is built: "eager" as part of the analysis, "background" as a low priority
+# job once the analysis completed, or "on_demand" by the first download. Downloads that come
+# before a background build finish build it themselves (or wait for the build in progress).
+PDF_REPORT_MODE = "background"
+# Builders refresh their claim on a report every PROCESSING_HEARTBEAT_INTERVAL seconds; a claim
+# not refreshed for PDF_BUILD_STALE_AFTER belongs to a builder that died and is taken over
+PDF_BUILD_STALE_AFTER = 5 * 60
+# downloads never wait for a build running elsewhere, they get 202 and come back after this
+PDF_BUILD_RETRY_AFTER = 5
+
+# Let the front web server send downloaded files instead of a Django worker: None (Django
+# streams them), "x-accel-redirect" (nginx) or "x-sendfile" (Apache mod_xsendfile, lighttpd).
+# For nginx, FILE_SERVE_ACCEL_PREFIX has to be an internal location aliasing MEDIA_ROOT:
+#   location /protected-media/ { internal; alias /path/to/backend/media/; }
+FILE_SERVE_BACKEND = None
+FILE_SERVE_ACCEL_PREFIX = "/protected-media/"
+
+# widths a chart can be scaled down to with ?width=; requests are rounded up to the next one
+CHART_VARIANT_WIDTHS = (320, 640, 960, 1280, 1920)
+
+# How charts are rendered for each use. "format" is anything matplotlib saves (png, webp,
+# svg, ...), "dpi" is ignored for vector formats. Only the display profile is rendered
+# during the analysis; the others are rendered from the stored chart specs on first use
+# (?profile= on the chart API, the PDF build for the report profile, which has to be raster).
+CHART_PROFILES = {
+    "screen": {"format": "png", "dpi": 100},
+    "thumbnail": {"format": "png", "dpi": 32},
+    "vector": {"format": "svg"},
+    "print": {"format": "png", "dpi": 300},
+}
+CHART_DISPLAY_PROFILE = "screen"
+CHART_REPORT_PROFILE = "print"
+
+# "server" renders the display charts during the analysis. "client" only stores the chart
+# data (GET dataset-charts/<id>/data/) for clients that draw the charts themselves; chart
+# images are then rendered the first time they are requested.
+CHART_RENDER_MODE = "server"
+
+# least seconds between two progress updates a running analysis writes to its Dataset
+ANALYSIS_PROGRESS_INTERVAL = 1.0
+
+# adds per-stage allocation peaks (tracemalloc) to Dataset.timings, slows the analysis down
+ANALYSIS_TRACE_MEMORY = False
+
+# Results of identical uploads are reused; unreferenced cached artifacts are
+# evicted least recently used first once the cache grows past this size
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2GB
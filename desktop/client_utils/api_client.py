@@ -1,11 +1,64 @@
+import os
+import random
+import threading
 import requests
-from config import BASE_URL, TIMEOUT, ENDPOINTS
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import (
+    BASE_URL, TIMEOUT, TIMEOUTS, ENDPOINTS, RETRIES, RETRY_BACKOFF, COMPRESS_RESPONSES
+)
+from client_utils.transfer import CHUNK_SIZE, MultipartFile, progress_reporter, response_range
+
+
+class JitteredRetry(Retry):
+    # full jitter, so clients that failed together don't all retry at the same moment
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+_local = threading.local()
+
+
+def get_session():
+    # one per thread: a requests.Session (its cookies, adapters and pool) isn't safe to share
+    # between the task pool threads. Every window on a thread reuses its kept-alive connection
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = create_session()
+    return session
+
+
+def create_session():
+    retry = JitteredRetry(
+        total=RETRIES,
+        connect=RETRIES,
+        read=RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        # 503 is the backend's "try again later" (queue full), left to the caller
+        status_forcelist=(502, 504),
+        allowed_methods=frozenset(['GET', 'HEAD', 'OPTIONS']),
+        raise_on_status=False
+    )
+    # a thread makes one request at a time, so one kept-alive connection per thread
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate' if COMPRESS_RESPONSES else 'identity'
+    return session
 
 
 class APIClient:
-    def __init__(self, token=None):
+    def __init__(self, token=None, session=None):
         self.token = token
         self.base_url = BASE_URL
+        # calls run on whichever pool thread picks them up, each uses that thread's session
+        self._session = session
+    
+    @property
+    def session(self):
+        return self._session or get_session()
         
     @property
     def headers(self):
@@ -19,71 +72,163 @@ class APIClient:
             endpoint = endpoint.format(**kwargs)
         return f"{self.base_url}{endpoint}"
     
+    def _request(self, method, endpoint_key, url=None, **kwargs):
+        kwargs.setdefault('timeout', TIMEOUTS.get(endpoint_key, TIMEOUT))
+        return self.session.request(method, url or self._build_url(endpoint_key), **kwargs)
+    
+    def _download(self, endpoint_key, url, path, progress=None, resume=True, **kwargs):
+        """GET `url` into the file `path`, returning the closed response.
+
+        The body goes to `path`.part in chunks and is renamed to `path` once complete, so
+        `path` is never half written. A .part left by an interrupted download is resumed
+        with a Range request, if the server still has the same file (If-Range). The file
+        is only written for 200 and 206 responses.
+
+        With `resume` False every call writes a .part of its own instead, for small files
+        that several threads may fetch at once.
+        """
+        partial = f"{path}.part" if resume else f"{path}.{threading.get_ident()}.part"
+        try:
+            for attempt in range(RETRIES + 1):
+                before = os.path.getsize(partial) if os.path.exists(partial) else 0
+                try:
+                    return self._download_once(endpoint_key, url, path, partial, progress, **kwargs)
+                except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError):
+                    # cut off in the middle of the body: carry on from what arrived
+                    grew = os.path.exists(partial) and os.path.getsize(partial) > before
+                    if attempt == RETRIES or not grew:
+                        raise
+        finally:
+            for leftover in (partial, f"{partial}.etag"):
+                if not resume and os.path.exists(leftover):
+                    os.remove(leftover)
+    
+    def _download_once(self, endpoint_key, url, path, partial, progress, **kwargs):
+        validator_file = f"{partial}.etag"
+        # byte offsets must count the stored bytes, not a compressed encoding of them
+        headers = {**self.headers, 'Accept-Encoding': 'identity'}
+        
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        if offset and os.path.exists(validator_file):
+            with open(validator_file) as f:
+                headers['Range'] = f"bytes={offset}-"
+                headers['If-Range'] = f.read().strip()
+        
+        with self._request('GET', endpoint_key, url, headers=headers, stream=True, **kwargs) as response:
+            restart = response.status_code == 416 and 'Range' in headers
+            if not restart and response.status_code not in (200, 206):
+                # small error body, read so the caller can show it
+                response.content
+                return response
+            
+            if not restart:
+                first, total = response_range(response)
+                restart = response.status_code == 206 and first != offset
+            if restart:
+                # the partial file is no part of what the server has now, start over
+                response.close()
+                os.remove(partial)
+                return self._download_once(endpoint_key, url, path, partial, progress, **kwargs)
+            
+            etag = response.headers.get('ETag')
+            if etag and not etag.startswith('W/'):
+                with open(validator_file, 'w') as f:
+                    f.write(etag)
+            elif os.path.exists(validator_file):
+                os.remove(validator_file)
+            
+            done = first
+            report = progress_reporter(progress, total)
+            with open(partial, 'ab' if first else 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    done += len(chunk)
+                    report(done)
+            
+            if total is not None and done != total:
+                raise requests.exceptions.ChunkedEncodingError(f"Got {done} of {total} bytes")
+            
+            os.replace(partial, path)
+            if os.path.exists(validator_file):
+                os.remove(validator_file)
+            report(done, force=True)
+        return response
+    
     def login(self, login_id, password):
-        url = self._build_url('login')
-        response = requests.post(url, json={
+        response = self._request('POST', 'login', json={
             "login_id": login_id,
             "password": password
-        }, timeout=TIMEOUT)
+        })
         return response
     
     def register(self, username, email, first_name, last_name, password, password2):
-        url = self._build_url('register')
-        response = requests.post(url, json={
+        response = self._request('POST', 'register', json={
             "username": username,
             "email": email,
             "first_name": first_name,
             "last_name": last_name,
             "password": password,
             "password2": password2
-        }, timeout=TIMEOUT)
+        })
         return response
     
     def logout(self, refresh_token):
-        url = self._build_url('logout')
-        response = requests.post(url, json={
+        response = self._request('POST', 'logout', json={
             "refresh": refresh_token
-        }, headers=self.headers, timeout=TIMEOUT)
+        }, headers=self.headers)
         return response
     
     def change_password(self, old_password, new_password, new_password2):
-        url = self._build_url('change_password')
-        response = requests.post(url, json={
+        response = self._request('POST', 'change_password', json={
             "old_password": old_password,
             "new_password": new_password,
             "new_password2": new_password2
-        }, headers=self.headers, timeout=TIMEOUT)
+        }, headers=self.headers)
         return response
     
     def reset_password_request(self, login_id):
-        url = self._build_url('password_reset_request')
-        response = requests.post(url, json={
+        response = self._request('POST', 'password_reset_request', json={
             "login_id": login_id
-        }, timeout=TIMEOUT)
+        })
         return response
     
     def reset_password_confirm(self, login_id, new_password, new_password2):
-        url = self._build_url('password_reset_confirm')
-        response = requests.post(url, json={
+        response = self._request('POST', 'password_reset_confirm', json={
             "login_id": login_id,
             "new_password": new_password,
             "new_password2": new_password2
-        }, timeout=TIMEOUT)
+        })
         return response
     
-    def upload_dataset(self, file_path):
-        url = self._build_url('upload_dataset')
-        with open(file_path, 'rb') as f:
-            files = {'dataset_file': f}
-            response = requests.post(url, files=files, headers=self.headers)
+    def upload_dataset(self, file_path, progress=None):
+        # streamed from disk, `progress(sent, total)` is called as the bytes go out
+        with MultipartFile('dataset_file', file_path, progress) as body:
+            headers = {**self.headers, 'Content-Type': body.content_type}
+            response = self._request('POST', 'upload_dataset', data=body, headers=headers)
         return response
     
     def get_datasets(self):
-        url = self._build_url('datasets')
-        response = requests.get(url, headers=self.headers)
+        response = self._request('GET', 'datasets', headers=self.headers)
+        return response
+    
+    def get_dataset_status(self, dataset_id):
+        # one dataset, with its analysis once completed
+        url = self._build_url('dataset_status', dataset_id=dataset_id)
+        response = self._request('GET', 'dataset_status', url, headers=self.headers)
+        return response
+    
+    def get_charts(self, dataset_id):
+        url = self._build_url('charts', dataset_id=dataset_id)
+        response = self._request('GET', 'charts', url, headers=self.headers)
+        return response
+    
+    def download_chart(self, url, path, width=None):
+        # `url` as listed by get_charts
+        params = {'width': width} if width else None
+        response = self._download('chart', url, path, resume=False, params=params)
         return response
     
-    def download_pdf(self, dataset_id):
+    def download_pdf(self, dataset_id, path, progress=None):
         url = self._build_url('download_pdf', dataset_id=dataset_id)
-        response = requests.get(url, headers=self.headers)
+        response = self._download('download_pdf', url, path, progress)
         return response
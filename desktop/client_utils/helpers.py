@@ -1,41 +1,26 @@
 import os
 from datetime import datetime
+from config import CHART_CACHE_DIR
 
 
 def format_timestamp():
     return datetime.now().strftime("%H:%M:%S")
 
 
-def get_media_path():
-    current_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
-    possible_paths = [
-        os.path.join(os.path.dirname(current_dir), "backend", "media"),
-        os.path.join(current_dir, "backend", "media"),
-        os.path.join(current_dir, "media"),
-    ]
-    
-    for path in possible_paths:
-        if os.path.exists(path):
-            return path
-    
-    return os.path.join(current_dir, "backend", "media")
-
-
-def get_charts_path(media_path, dataset_id):
-    return os.path.join(media_path, "analysis", str(dataset_id), "charts")
-
-
-def load_chart_files(charts_dir):
-    if not os.path.exists(charts_dir):
-        return []
-    
-    all_files = os.listdir(charts_dir)
-    return [
-        os.path.join(charts_dir, f) 
-        for f in all_files 
-        if f.endswith('.png')
-    ]
+def get_chart_cache_path(dataset_id, chart, width=None):
+    # the version changes whenever the server re-renders the chart, so cached files never go stale
+    suffix = f"-w{width}" if width else ""
+    name = f"{chart['version']}{suffix}-{chart['name']}"
+    return os.path.join(CHART_CACHE_DIR, str(dataset_id), name)
+
+
+def format_transfer(done, total, rate=None):
+    # "12.3 of 45.6 MB, 8.1 MB/s", `rate` in bytes per second
+    mb = 1024 * 1024
+    text = f"{done / mb:.1f} of {total / mb:.1f} MB" if total else f"{done / mb:.1f} MB"
+    if rate:
+        text += f", {rate / mb:.1f} MB/s"
+    return text
 
 
 def extract_error_message(response):
@@ -0,0 +1,150 @@
+import threading
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+from config import POOL_SIZE
+
+
+class TaskCancelled(Exception):
+    pass
+
+
+class TaskSignals(QObject):
+    # emitted from the worker thread with the task first, delivered on the GUI thread
+    finished = pyqtSignal(object, object)
+    failed = pyqtSignal(object, object)
+    progress = pyqtSignal(object, object, object)
+
+
+class ApiTask(QRunnable):
+    """Runs fn(*args, **kwargs) on a pool thread and reports back through `signals`.
+
+    Nothing is delivered once the task is cancelled. A call that reports progress is also
+    stopped at its next report, report_progress raises TaskCancelled then.
+    """
+
+    def __init__(self, signals, fn, *args, **kwargs):
+        super().__init__()
+        self.signals = signals
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = None
+        self.on_finished = None
+        self.on_failed = None
+        self.on_progress = None
+        self.done = False
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def report_progress(self, done, total=None):
+        if self.cancelled or not self._emit('progress', done, total):
+            raise TaskCancelled()
+
+    def _emit(self, name, *args):
+        # the application may be shutting down with the task still running
+        try:
+            getattr(self.signals, name).emit(self, *args)
+        except RuntimeError:
+            self.cancel()
+            return False
+        return True
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except TaskCancelled:
+            pass
+        except Exception as e:
+            if not self.cancelled:
+                self._emit('failed', e)
+        else:
+            if not self.cancelled:
+                self._emit('finished', result)
+        finally:
+            self.done = True
+
+
+class TaskRunner(QObject):
+    """Keeps API calls off the GUI thread, at most one in flight per key.
+
+    Starting a task cancels the one running under the same key, so only the latest
+    answer (the chart shown last, the newest dataset list) reaches the window.
+    """
+
+    def __init__(self, parent=None, max_threads=POOL_SIZE):
+        super().__init__(parent)
+        # each thread keeps its own connection to the backend, see api_client.get_session
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        self.tasks = {}
+
+        # one set of signals for every task: a QObject per task could be freed while one
+        # of its own signals is being delivered, when a callback drops the last reference
+        self.signals = TaskSignals(self)
+        self.signals.finished.connect(self._finished)
+        self.signals.failed.connect(self._failed)
+        self.signals.progress.connect(self._progress)
+
+        app = QCoreApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.shutdown)
+
+    def busy(self, key):
+        task = self.tasks.get(key)
+        return task is not None and not task.done
+
+    def run(self, key, fn, *args, on_finished=None, on_failed=None, on_progress=None, **kwargs):
+        self.cancel(key)
+
+        task = ApiTask(self.signals, fn, *args, **kwargs)
+        task.key = key
+        task.on_finished = on_finished
+        task.on_failed = on_failed
+        task.on_progress = on_progress
+        if on_progress:
+            # the call reports through the task, which is also where it learns it was cancelled
+            task.kwargs['progress'] = task.report_progress
+
+        self.tasks[key] = task
+        self.pool.start(task)
+        return task
+
+    def cancel(self, key):
+        task = self.tasks.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        for key in list(self.tasks):
+            self.cancel(key)
+
+    def shutdown(self):
+        # waited for here rather than when the pool is destroyed, which would hold the GIL
+        # the pool threads need to finish
+        self.cancel_all()
+        self.pool.waitForDone()
+
+    def _finished(self, task, result):
+        # a task cancelled after it answered: the answer was already on its way
+        if self._forget(task) and task.on_finished:
+            task.on_finished(result)
+
+    def _failed(self, task, error):
+        if self._forget(task) and task.on_failed:
+            task.on_failed(error)
+
+    def _progress(self, task, done, total):
+        if not task.cancelled and task.on_progress:
+            task.on_progress(done, total)
+
+    def _forget(self, task):
+        if task.cancelled:
+            return False
+        if self.tasks.get(task.key) is task:
+            del self.tasks[task.key]
+        return True
@@ -0,0 +1,106 @@
+import mimetypes
+import os
+import re
+import uuid
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE_RE = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+
+
+def progress_reporter(progress, total, steps=200):
+    """report(done) calling progress(done, total) at most about `steps` times per transfer.
+
+    Transfers move a few KB per read, a progress signal for each would flood the GUI thread.
+    """
+    step = max(total // steps, 1) if total else CHUNK_SIZE * 16
+    last = [None]
+
+    def report(done, force=False):
+        if progress is None:
+            return
+        if force or last[0] is None or done - last[0] >= step or done == total:
+            last[0] = done
+            progress(done, total)
+
+    return report
+
+
+class MultipartFile:
+    """multipart/form-data body with one file field, read from disk while it is sent.
+
+    Has a length, so requests sends it with a Content-Length instead of chunked encoding
+    (which Django's server doesn't accept), and only one chunk is in memory at a time.
+    """
+
+    def __init__(self, field, path, progress=None, content_type=None):
+        boundary = uuid.uuid4().hex
+        filename = os.path.basename(path).replace('"', '%22')
+        content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        self.head = (
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n'
+        ).encode('utf-8')
+        self.tail = f'\r\n--{boundary}--\r\n'.encode('utf-8')
+        self.path = path
+        self.size = len(self.head) + os.path.getsize(path) + len(self.tail)
+        self.report = progress_reporter(progress, self.size)
+        self.file = None
+        self.position = 0
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        self.file = open(self.path, 'rb')
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+        return False
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=0):
+        # only rewinding, which is what a retried request does
+        if offset != 0 or whence != 0:
+            raise OSError("MultipartFile can only seek to the start")
+        self.position = 0
+        self.file.seek(0)
+        return 0
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size
+        data = b""
+        head_end = len(self.head)
+        file_end = self.size - len(self.tail)
+
+        if self.position < head_end:
+            data += self.head[self.position:self.position + size]
+        if len(data) < size and self.position + len(data) < file_end:
+            data += self.file.read(min(size - len(data), CHUNK_SIZE))
+        if len(data) < size and self.position + len(data) >= file_end:
+            start = self.position + len(data) - file_end
+            data += self.tail[start:start + size - len(data)]
+
+        self.position += len(data)
+        if data:
+            self.report(self.position)
+        return data
+
+
+def response_range(response):
+    """(first byte, total size or None) of a 200 or 206 download response."""
+    if response.status_code == 206:
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        if match is None:
+            raise IOError(f"Unusable Content-Range: {response.headers.get('Content-Range')}")
+        first, _, total = match.groups()
+        return int(first), None if total == '*' else int(total)
+
+    length = response.headers.get('Content-Length')
+    return 0, int(length) if length and length.isdigit() else None
@@ -1,6 +1,38 @@
+import os
+import tempfile
+
 BASE_URL = "http://localhost:8000/api"
 TIMEOUT = 5
-POLL_INTERVAL = 3000
+# milliseconds between dataset status checks: POLL_INTERVAL at first, growing by POLL_BACKOFF
+# each time nothing changed, up to POLL_MAX_INTERVAL for long jobs
+POLL_INTERVAL = 1000
+POLL_BACKOFF = 2
+POLL_MAX_INTERVAL = 30000
+
+# (connect, read) seconds per endpoint, TIMEOUT for the rest. Connecting fails fast; reads
+# are as long as the server may legitimately take (the first PDF download builds the report)
+TIMEOUTS = {
+    'upload_dataset': (3.05, 300),
+    'download_pdf': (3.05, 180),
+    'chart': (3.05, 30),
+}
+
+# idempotent requests (GET) are retried on connection errors and gateway errors,
+# RETRY_BACKOFF * 2^n seconds apart with random jitter
+RETRIES = 3
+RETRY_BACKOFF = 0.5
+
+# threads running API calls, each keeps its own alive connection to the backend
+POOL_SIZE = 4
+
+# ask for gzip-compressed JSON responses
+COMPRESS_RESPONSES = True
+
+# charts downloaded from the API, one folder per dataset
+CHART_CACHE_DIR = os.path.join(tempfile.gettempdir(), "csv_analyzer_charts")
+
+# decoded charts kept in memory for instant paging, least recently shown dropped first
+CHART_PIXMAP_CACHE_MB = 64
 
 ENDPOINTS = {
     'login': '/auth/login/',
@@ -11,7 +43,9 @@ ENDPOINTS = {
     'password_reset_confirm': '/auth/password-reset-confirm/',
     'upload_dataset': '/upload-dataset/',
     'datasets': '/datasets/',
+    'dataset_status': '/dataset-status/{dataset_id}/',
     'download_pdf': '/download-pdf/{dataset_id}/',
+    'charts': '/dataset-charts/{dataset_id}/',
 }
 
 STYLES = {
@@ -1,24 +1,121 @@
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-from PIL import Image
-
-
-class Chart(FigureCanvas):
-    def __init__(self, parent=None):
-        self.fig = Figure(figsize=(8, 6))
-        super().__init__(self.fig)
-        self.setParent(parent)
-    
-    def plot_image(self, image_path):
-        self.fig.clear()
-        ax = self.fig.add_subplot(111)
-        
+from collections import OrderedDict
+from PyQt5.QtCore import Qt, QSize, QTimer
+from PyQt5.QtGui import QImageReader, QPixmap
+from PyQt5.QtWidgets import QLabel, QSizePolicy
+from config import CHART_PIXMAP_CACHE_MB
+
+
+def decode_image(path, size, ratio=1.0):
+    """The image at `path` decoded and scaled to fit `size` (device-independent pixels).
+
+    Returns a QImage, which unlike QPixmap can be made on any thread. Raises OSError
+    when the file can't be read.
+    """
+    reader = QImageReader(path)
+    original = reader.size()
+    if original.isValid():
+        target = original.scaled(QSize(int(size.width() * ratio), int(size.height() * ratio)), Qt.KeepAspectRatio)
+        # never scaled up, a small chart stays sharp
+        if target.width() < original.width():
+            reader.setScaledSize(target)
+    image = reader.read()
+    if image.isNull():
+        raise OSError(f"Can't read {path}: {reader.errorString()}")
+    image.setDevicePixelRatio(ratio)
+    return image
+
+
+class PixmapCache:
+    # least recently used pixmaps go first once they add up to more than `max_bytes`
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.items = OrderedDict()
+
+    def get(self, key):
+        pixmap = self.items.get(key)
+        if pixmap is not None:
+            self.items.move_to_end(key)
+        return pixmap
+
+    def put(self, key, pixmap):
+        if key in self.items:
+            self.bytes -= self._size(self.items.pop(key))
+        self.items[key] = pixmap
+        self.bytes += self._size(pixmap)
+        while self.bytes > self.max_bytes and len(self.items) > 1:
+            _, oldest = self.items.popitem(last=False)
+            self.bytes -= self._size(oldest)
+
+    @staticmethod
+    def _size(pixmap):
+        return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+class Chart(QLabel):
+    """Shows chart images decoded once at the size they are shown.
+
+    Pixmaps are kept per (path, size) in a bounded LRU cache, so paging back and forth
+    is instant. Images decoded elsewhere (decode_image on a worker thread) are added with
+    `add_image`.
+    """
+
+    def __init__(self, parent=None, cache_mb=CHART_PIXMAP_CACHE_MB):
+        super().__init__(parent)
+        self.cache = PixmapCache(cache_mb * 1024 * 1024)
+        self.image_path = None
+        self.setAlignment(Qt.AlignCenter)
+        self.setMinimumSize(200, 150)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+
+        # decoded again once resizing stops, in between the pixmap is only stretched
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.timeout.connect(self.refresh)
+
+    def display_size(self):
+        return self.contentsRect().size()
+
+    def ratio(self):
+        return self.devicePixelRatioF()
+
+    def cache_key(self, image_path, size=None):
+        size = size or self.display_size()
+        return (image_path, size.width(), size.height(), self.ratio())
+
+    def cached(self, image_path):
+        return self.cache.get(self.cache_key(image_path)) is not None
+
+    def add_image(self, image_path, image, size):
+        # from a QImage decoded for `size`; QPixmaps can only be made on the GUI thread
+        pixmap = QPixmap.fromImage(image)
+        self.cache.put(self.cache_key(image_path, size), pixmap)
+        return pixmap
+
+    def plot_image(self, image_path, image=None, size=None):
+        self.image_path = image_path
+        size = size or self.display_size()
+        pixmap = self.cache.get(self.cache_key(image_path, size))
         try:
-            img = Image.open(image_path)
-            ax.imshow(img)
-            ax.axis('off')
-            self.draw()
-        except Exception as e:
-            ax.text(0.5, 0.5, f'Error loading image:\n{str(e)}', 
-                   ha='center', va='center', transform=ax.transAxes)
-            self.draw()
\ No newline at end of file
+            if pixmap is None:
+                if image is None:
+                    image = decode_image(image_path, size, self.ratio())
+                pixmap = self.add_image(image_path, image, size)
+        except OSError as e:
+            self.clear()
+            self.setText(f"Error loading image:\n{str(e)}")
+            return
+        self.setPixmap(pixmap)
+
+    def refresh(self):
+        if self.image_path:
+            self.plot_image(self.image_path)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        pixmap = self.pixmap()
+        if pixmap is not None and not pixmap.isNull():
+            stretched = pixmap.scaled(self.display_size() * self.ratio(), Qt.KeepAspectRatio)
+            stretched.setDevicePixelRatio(self.ratio())
+            self.setPixmap(stretched)
+        self.resize_timer.start(150)
@@ -1,18 +1,19 @@
 import os
+import time
 import requests
 from PyQt5.QtWidgets import (
     QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QPushButton, 
     QLabel, QFileDialog, QMessageBox, QTableWidget, QTableWidgetItem,
-    QTabWidget, QTextEdit, QApplication
+    QTabWidget, QTextEdit, QApplication, QProgressBar
 )
 from PyQt5.QtCore import QTimer
-from config import STYLES, POLL_INTERVAL
+from config import STYLES, POLL_INTERVAL, POLL_BACKOFF, POLL_MAX_INTERVAL
 from client_utils.api_client import APIClient
+from client_utils.tasks import TaskRunner
 from client_utils.helpers import (
-    format_timestamp, get_media_path, get_charts_path, 
-    load_chart_files, extract_error_message
+    format_timestamp, format_transfer, get_chart_cache_path, extract_error_message
 )
-from widgets.chart import Chart
+from widgets.chart import Chart, decode_image
 from dialogs.change_password import ChangePasswordDialog
 from PyQt5.QtCore import QTimer, Qt
 
@@ -24,11 +25,23 @@ class HomePage(QMainWindow):
         self.refresh_token = refresh_token
         self.user_data = user_data or {}
         self.api_client = APIClient(token)
+        # every API call runs on a worker thread, the window never waits for the network
+        self.tasks = TaskRunner(self)
+        self.poll_timer = None
+        self.poll_interval = POLL_INTERVAL
+        self.status_version = None
+        self.transfers = {}
+        # a report still being built on the server is asked for again after its Retry-After
+        self.pdf_retry_timer = QTimer(self)
+        self.pdf_retry_timer.setSingleShot(True)
+        self.pdf_retry_timer.timeout.connect(lambda: self.run_pdf_download(*self.pdf_request))
+        self.pdf_request = None
         self.current_dataset_id = None
-        self.chart_paths = []
+        self.analysis = None
+        self.charts = []
+        self.chart_widths = []
         self.current_chart_index = 0
         
-        self.media_path = get_media_path()
         self.init_ui()
         self.load_datasets()
     
@@ -50,8 +63,6 @@ class HomePage(QMainWindow):
         
         main_layout.addWidget(self.tabs)
         central_widget.setLayout(main_layout)
-        
-        QTimer.singleShot(500, lambda: self.log(f"Media path: {self.media_path}"))
     
     def create_header(self):
         header_layout = QHBoxLayout()
@@ -70,10 +81,10 @@ class HomePage(QMainWindow):
         change_password_btn.setStyleSheet("padding: 5px 10px;")
         header_layout.addWidget(change_password_btn)
         
-        logout_btn = QPushButton("Logout")
-        logout_btn.clicked.connect(self.logout)
-        logout_btn.setStyleSheet(STYLES['danger_button'])
-        header_layout.addWidget(logout_btn)
+        self.logout_btn = QPushButton("Logout")
+        self.logout_btn.clicked.connect(self.logout)
+        self.logout_btn.setStyleSheet(STYLES['danger_button'])
+        header_layout.addWidget(self.logout_btn)
         
         return header_layout
     
@@ -92,12 +103,20 @@ class HomePage(QMainWindow):
         upload_section.addWidget(self.file_label)
         upload_section.addWidget(self.select_btn)
         upload_section.addWidget(self.upload_btn)
+        self.cancel_btn = QPushButton("Cancel")
+        self.cancel_btn.clicked.connect(self.cancel_transfer)
+        self.cancel_btn.setEnabled(False)
+        upload_section.addWidget(self.cancel_btn)
         layout.addLayout(upload_section)
         
         self.status_label = QLabel("Status: Ready")
         self.status_label.setStyleSheet(STYLES['status_ready'])
         layout.addWidget(self.status_label)
         
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        layout.addWidget(self.progress_bar)
+        
         self.download_btn = QPushButton("Download PDF Report")
         self.download_btn.clicked.connect(self.download_pdf)
         self.download_btn.setEnabled(False)
@@ -172,87 +191,288 @@ class HomePage(QMainWindow):
         if not hasattr(self, 'selected_file'):
             return
         
-        try:
-            response = self.api_client.upload_dataset(self.selected_file)
-            
-            if response.status_code == 202:
-                data = response.json()
-                self.current_dataset_id = data.get('dataset_id')
-                self.log(f"Upload successful! Dataset ID: {self.current_dataset_id}")
-                self.log(data.get('message', 'Processing started'))
-                self.status_label.setText("Status: Processing...")
-                self.status_label.setStyleSheet(STYLES['status_processing'])
-                self.start_status_polling()
-            else:
-                error_msg = extract_error_message(response)
-                self.log(f"Upload failed: {error_msg}")
-                QMessageBox.warning(self, "Error", f"Upload failed: {error_msg}")
-        
-        except Exception as e:
-            self.log(f"Error: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Upload error: {str(e)}")
-    
-    def start_status_polling(self):
-        self.poll_timer = QTimer()
+        self.upload_btn.setEnabled(False)
+        self.select_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.status_label.setText("Status: Uploading...")
+        self.status_label.setStyleSheet(STYLES['status_processing'])
+        self.log(f"Uploading {os.path.basename(self.selected_file)}...")
+        self.start_transfer('upload')
+        self.tasks.run(
+            'upload', self.api_client.upload_dataset, self.selected_file,
+            on_finished=self.on_upload_finished,
+            on_failed=self.on_upload_failed,
+            on_progress=self.on_upload_progress
+        )
+    
+    def on_upload_progress(self, sent, total):
+        text = self.show_progress('upload', sent, total)
+        if sent == total:
+            self.status_label.setText("Status: Uploaded, waiting for the server...")
+        else:
+            self.status_label.setText(f"Status: Uploading... {text}")
+    
+    def start_transfer(self, key):
+        self.transfers[key] = (time.monotonic(), None)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+    
+    def show_progress(self, key, done, total):
+        # throughput of this transfer only, a resumed download counts from where it resumed
+        started, first = self.transfers.get(key, (time.monotonic(), None))
+        if first is None:
+            first = done
+            self.transfers[key] = (started, first)
+        seconds = time.monotonic() - started
+        text = format_transfer(done, total, (done - first) / seconds if seconds > 0 else None)
+        
+        if total:
+            self.progress_bar.setRange(0, 1000)
+            self.progress_bar.setValue(int(done * 1000 / total))
+            self.progress_bar.setFormat(f"%p%  ({text})")
+        else:
+            # size unknown: a busy indicator
+            self.progress_bar.setRange(0, 0)
+        return text
+    
+    def end_transfer(self, key):
+        self.transfers.pop(key, None)
+        if not self.transfers:
+            self.progress_bar.setVisible(False)
+    
+    def on_upload_finished(self, response):
+        self.upload_done()
+        if response.status_code == 202:
+            data = response.json()
+            self.current_dataset_id = data.get('dataset_id')
+            self.log(f"Upload successful! Dataset ID: {self.current_dataset_id}")
+            self.log(data.get('message', 'Processing started'))
+            self.status_label.setText("Status: Processing...")
+            self.start_status_polling()
+        else:
+            error_msg = extract_error_message(response)
+            self.status_label.setText("Status: Ready")
+            self.status_label.setStyleSheet(STYLES['status_ready'])
+            self.log(f"Upload failed: {error_msg}")
+            QMessageBox.warning(self, "Error", f"Upload failed: {error_msg}")
+    
+    def on_upload_failed(self, error):
+        self.upload_done()
+        self.status_label.setText("Status: Ready")
+        self.status_label.setStyleSheet(STYLES['status_ready'])
+        self.log(f"Error: {str(error)}")
+        QMessageBox.critical(self, "Error", f"Upload error: {str(error)}")
+    
+    def upload_done(self):
+        self.end_transfer('upload')
+        self.upload_btn.setEnabled(True)
+        self.select_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(self.tasks.busy('pdf') or self.pdf_retry_timer.isActive())
+    
+    def cancel_transfer(self):
+        # transfers stop at their next chunk; an upload already sent in full is still processed
+        if self.tasks.busy('upload'):
+            self.tasks.cancel('upload')
+            self.upload_done()
+            self.status_label.setText("Status: Ready")
+            self.status_label.setStyleSheet(STYLES['status_ready'])
+            self.log("Upload cancelled")
+        if self.tasks.busy('pdf') or self.pdf_retry_timer.isActive():
+            self.tasks.cancel('pdf')
+            self.pdf_retry_timer.stop()
+            self.download_done()
+            self.log("PDF download cancelled")
+    
+    def start_status_polling(self, delay=POLL_INTERVAL):
+        # one timer, a second upload must not add another poller. It is single shot and
+        # restarted after each answer, so there is never more than one check in flight
+        self.stop_status_polling()
+        self.poll_interval = POLL_INTERVAL
+        self.status_version = None
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setSingleShot(True)
         self.poll_timer.timeout.connect(self.check_status)
-        self.poll_timer.start(POLL_INTERVAL)
+        self.poll_timer.start(delay)
+    
+    def schedule_status_check(self):
+        if self.poll_timer is not None:
+            self.poll_timer.start(self.poll_interval)
+    
+    def stop_status_polling(self):
+        if self.poll_timer is not None:
+            self.poll_timer.stop()
+            self.poll_timer = None
+        self.tasks.cancel('status')
     
     def check_status(self):
-        if not self.current_dataset_id:
+        if not self.current_dataset_id or self.tasks.busy('status'):
             return
         
-        try:
-            response = self.api_client.get_datasets()
-            
-            if response.status_code == 200:
-                datasets = response.json()
-                current = next((d for d in datasets if d['id'] == self.current_dataset_id), None)
-                
-                if current:
-                    status = current['status']
-                    self.status_label.setText(f"Status: {status.capitalize()}")
-                    
-                    if status == 'completed':
-                        self.status_label.setStyleSheet(STYLES['status_completed'])
-                        self.log("Processing completed! PDF ready for download.")
-                        self.download_btn.setEnabled(True)
-                        self.poll_timer.stop()
-                        self.load_charts()
-                    
-                    elif status == 'failed':
-                        self.status_label.setStyleSheet(STYLES['status_failed'])
-                        error_msg = current.get('error_message', 'Unknown error')
-                        self.log(f"Processing failed: {error_msg}")
-                        QMessageBox.warning(self, "Processing Failed", error_msg)
-                        self.poll_timer.stop()
-        
-        except Exception as e:
-            self.log(f"Status check error: {str(e)}")
+        dataset_id = self.current_dataset_id
+        self.tasks.run(
+            'status', self.api_client.get_dataset_status, dataset_id,
+            on_finished=lambda response: self.on_status(dataset_id, response),
+            on_failed=self.on_status_failed
+        )
+    
+    def on_status_failed(self, error):
+        self.log(f"Status check error: {str(error)}")
+        self.back_off()
+        self.schedule_status_check()
+    
+    def back_off(self):
+        self.poll_interval = min(self.poll_interval * POLL_BACKOFF, POLL_MAX_INTERVAL)
+    
+    def on_status(self, dataset_id, response):
+        if dataset_id != self.current_dataset_id:
+            return
+        
+        if response.status_code == 404:
+            self.log(f"Dataset {dataset_id} no longer exists")
+            self.stop_status_polling()
+            return
+        if response.status_code != 200:
+            self.log(f"Status check failed: {extract_error_message(response)}")
+            self.back_off()
+            self.schedule_status_check()
+            return
+        
+        data = response.json()
+        status = data['status']
+        progress = data.get('progress') or {}
+        if status in ('pending', 'processing') and progress.get('stage'):
+            self.status_label.setText(
+                f"Status: {status.capitalize()} ({progress['stage']}, {progress.get('percent', 0)}%)"
+            )
+        else:
+            self.status_label.setText(f"Status: {status.capitalize()}")
+        
+        if status == 'completed':
+            # the analysis comes with the final status, no second request for it
+            self.analysis = data.get('analysis')
+            self.stop_status_polling()
+            self.status_label.setStyleSheet(STYLES['status_completed'])
+            rows = (self.analysis or {}).get('total_rows')
+            self.log(f"Processing completed ({rows} rows)! PDF ready for download." if rows is not None
+                     else "Processing completed! PDF ready for download.")
+            self.download_btn.setEnabled(True)
+            self.load_charts()
+        
+        elif status == 'failed':
+            self.stop_status_polling()
+            self.status_label.setStyleSheet(STYLES['status_failed'])
+            error_msg = data.get('error') or 'Unknown error'
+            self.log(f"Processing failed: {error_msg}")
+            QMessageBox.warning(self, "Processing Failed", error_msg)
+        
+        else:
+            # checked less and less often while the job runs on without a change
+            if data.get('version') == self.status_version:
+                self.back_off()
+            self.status_version = data.get('version')
+            self.schedule_status_check()
     
     def load_charts(self):
         if not self.current_dataset_id:
             return
         
-        charts_dir = get_charts_path(self.media_path, self.current_dataset_id)
-        self.log(f"Looking for charts in: {charts_dir}")
+        dataset_id = self.current_dataset_id
+        for key in ('chart', 'prefetch-next', 'prefetch-previous'):
+            self.tasks.cancel(key)
+        self.tasks.run(
+            'charts', self.api_client.get_charts, dataset_id,
+            on_finished=lambda response: self.on_charts_loaded(dataset_id, response),
+            on_failed=lambda e: self.log(f"Error loading charts: {str(e)}")
+        )
+    
+    def on_charts_loaded(self, dataset_id, response):
+        if dataset_id != self.current_dataset_id:
+            return
         
-        self.chart_paths = load_chart_files(charts_dir)
+        if response.status_code != 200:
+            self.log(f"Failed to load charts: {extract_error_message(response)}")
+            return
         
-        if self.chart_paths:
+        data = response.json()
+        self.charts = data.get('charts', [])
+        self.chart_widths = data.get('widths', [])
+        
+        if self.charts:
             self.current_chart_index = 0
             self.show_chart(0)
             self.update_chart_navigation()
-            self.log(f"Loaded {len(self.chart_paths)} charts")
+            self.log(f"Loaded {len(self.charts)} charts")
         else:
-            self.log(f"No charts found in {charts_dir}")
+            self.log(f"No charts found for dataset {self.current_dataset_id}")
+    
+    def chart_width(self, chart):
+        # charts are downloaded on first view, at about the size they are shown
+        # rounded up to a width the server renders, so resizing the window reuses the files
+        shown = self.chart_canvas.width()
+        width = next((w for w in sorted(self.chart_widths) if w >= shown), None)
+        # a chart the server hasn't rendered yet has no known width
+        if width is not None and chart.get('width') is not None and width >= chart['width']:
+            width = None
+        return width
+    
+    def fetch_chart(self, dataset_id, chart, width):
+        # runs on a worker thread: no widgets in here
+        path = get_chart_cache_path(dataset_id, chart, width)
+        if os.path.exists(path):
+            return path
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        response = self.api_client.download_chart(chart['url'], path, width)
+        if response.status_code != 200:
+            raise RuntimeError(extract_error_message(response))
+        return path
+    
+    def load_chart(self, dataset_id, chart, width, size, ratio):
+        # worker thread as well: downloaded if needed and decoded at the size it is shown
+        path = self.fetch_chart(dataset_id, chart, width)
+        return path, decode_image(path, size, ratio), size
+    
+    def run_chart_task(self, key, index, on_finished, on_failed):
+        chart = self.charts[index]
+        width = self.chart_width(chart)
+        path = get_chart_cache_path(self.current_dataset_id, chart, width)
+        if self.chart_canvas.cached(path):
+            self.tasks.cancel(key)
+            return path
+        
+        self.tasks.run(
+            key, self.load_chart, self.current_dataset_id, chart, width,
+            self.chart_canvas.display_size(), self.chart_canvas.ratio(),
+            on_finished=on_finished,
+            on_failed=on_failed
+        )
+        return None
     
     def show_chart(self, index):
-        if 0 <= index < len(self.chart_paths):
-            self.chart_canvas.plot_image(self.chart_paths[index])
+        if 0 <= index < len(self.charts):
+            chart = self.charts[index]
+            # paging quickly only fetches the chart that ends up shown
+            path = self.run_chart_task(
+                'chart', index,
+                on_finished=lambda result: self.chart_canvas.plot_image(*result),
+                on_failed=lambda e: self.log(f"Error loading chart {chart['name']}: {str(e)}")
+            )
+            if path is not None:
+                self.chart_canvas.plot_image(path)
             self.chart_info_label.setText(
-                f"Chart {index + 1} of {len(self.chart_paths)}: "
-                f"{os.path.basename(self.chart_paths[index])}"
+                f"Chart {index + 1} of {len(self.charts)}: {chart['name']}"
             )
+            self.prefetch_charts(index)
+    
+    def prefetch_charts(self, index):
+        # the neighbours are made ready in the background, so Previous/Next show them at once
+        for key, neighbour in (('prefetch-next', index + 1), ('prefetch-previous', index - 1)):
+            if 0 <= neighbour < len(self.charts):
+                self.run_chart_task(
+                    key, neighbour,
+                    on_finished=lambda result: self.chart_canvas.add_image(*result),
+                    on_failed=lambda e: None
+                )
     
     def show_previous_chart(self):
         if self.current_chart_index > 0:
@@ -261,72 +481,104 @@ class HomePage(QMainWindow):
             self.update_chart_navigation()
     
     def show_next_chart(self):
-        if self.current_chart_index < len(self.chart_paths) - 1:
+        if self.current_chart_index < len(self.charts) - 1:
             self.current_chart_index += 1
             self.show_chart(self.current_chart_index)
             self.update_chart_navigation()
     
     def update_chart_navigation(self):
         self.prev_btn.setEnabled(self.current_chart_index > 0)
-        self.next_btn.setEnabled(self.current_chart_index < len(self.chart_paths) - 1)
+        self.next_btn.setEnabled(self.current_chart_index < len(self.charts) - 1)
     
     def download_pdf(self):
         if not self.current_dataset_id:
             return
         
-        try:
-            response = self.api_client.download_pdf(self.current_dataset_id)
-            
-            if response.status_code == 200:
-                save_path, _ = QFileDialog.getSaveFileName(
-                    self, 
-                    "Save PDF Report", 
-                    f"report_{self.current_dataset_id}.pdf", 
-                    "PDF Files (*.pdf)"
-                )
-                
-                if save_path:
-                    with open(save_path, 'wb') as f:
-                        f.write(response.content)
-                    self.log(f"PDF saved to: {save_path}")
-                    QMessageBox.information(self, "Success", "PDF report downloaded successfully!")
-            else:
-                error_msg = extract_error_message(response)
-                QMessageBox.warning(self, "Error", error_msg)
-        
-        except Exception as e:
-            self.log(f"Download error: {str(e)}")
-            QMessageBox.critical(self, "Error", f"Download error: {str(e)}")
+        # asked first, so the download can run while the window stays usable
+        save_path, _ = QFileDialog.getSaveFileName(
+            self, 
+            "Save PDF Report", 
+            f"report_{self.current_dataset_id}.pdf", 
+            "PDF Files (*.pdf)"
+        )
+        if not save_path:
+            return
+        
+        self.download_btn.setEnabled(False)
+        self.cancel_btn.setEnabled(True)
+        self.log("Downloading PDF report...")
+        self.start_transfer('pdf')
+        self.run_pdf_download(self.current_dataset_id, save_path)
+    
+    def run_pdf_download(self, dataset_id, save_path):
+        self.pdf_request = (dataset_id, save_path)
+        # straight to disk, an interrupted download resumes where it stopped
+        self.tasks.run(
+            'pdf', self.api_client.download_pdf, dataset_id, save_path,
+            on_finished=lambda response: self.on_pdf_finished(response, save_path),
+            on_failed=self.on_pdf_failed,
+            on_progress=lambda done, total: self.show_progress('pdf', done, total)
+        )
+    
+    def on_pdf_finished(self, response, save_path):
+        if response.status_code == 202:
+            # built elsewhere right now, the server says when to come back
+            retry_after = response.headers.get('Retry-After', '')
+            delay = int(retry_after) if retry_after.isdigit() else 5
+            self.log(f"PDF report is still being generated, trying again in {delay}s...")
+            self.pdf_retry_timer.start(delay * 1000)
+            return
+        self.download_done()
+        if response.status_code in (200, 206):
+            self.log(f"PDF saved to: {save_path}")
+            QMessageBox.information(self, "Success", "PDF report downloaded successfully!")
+        else:
+            error_msg = extract_error_message(response)
+            QMessageBox.warning(self, "Error", error_msg)
+    
+    def on_pdf_failed(self, error):
+        self.download_done()
+        self.log(f"Download error: {str(error)}")
+        QMessageBox.critical(self, "Error", f"Download error: {str(error)}")
+    
+    def download_done(self):
+        self.end_transfer('pdf')
+        self.download_btn.setEnabled(self.current_dataset_id is not None)
+        self.cancel_btn.setEnabled(self.tasks.busy('upload'))
     
     def load_datasets(self):
-        try:
-            response = self.api_client.get_datasets()
+        self.tasks.run(
+            'datasets', self.api_client.get_datasets,
+            on_finished=self.on_datasets_loaded,
+            on_failed=lambda e: self.log(f"Error loading history: {str(e)}")
+        )
+    
+    def on_datasets_loaded(self, response):
+        if response.status_code == 200:
+            datasets = response.json()
+            self.history_table.setRowCount(len(datasets))
             
-            if response.status_code == 200:
-                datasets = response.json()
-                self.history_table.setRowCount(len(datasets))
-                
-                for row, dataset in enumerate(datasets):
-                    self.history_table.setItem(row, 0, QTableWidgetItem(str(dataset['id'])))
-                    self.history_table.setItem(row, 1, QTableWidgetItem(dataset['status']))
-                    self.history_table.setItem(row, 2, QTableWidgetItem(dataset['uploaded_at']))
-                    
-                    view_btn = QPushButton("View")
-                    view_btn.clicked.connect(lambda checked, d_id=dataset['id']: self.view_dataset(d_id))
-                    self.history_table.setCellWidget(row, 3, view_btn)
+            for row, dataset in enumerate(datasets):
+                self.history_table.setItem(row, 0, QTableWidgetItem(str(dataset['id'])))
+                self.history_table.setItem(row, 1, QTableWidgetItem(dataset['status']))
+                self.history_table.setItem(row, 2, QTableWidgetItem(dataset['uploaded_at']))
                 
-                self.log(f"Loaded {len(datasets)} datasets from history")
-            else:
-                self.log(f"Failed to load datasets: {response.text}")
-        
-        except Exception as e:
-            self.log(f"Error loading history: {str(e)}")
+                view_btn = QPushButton("View")
+                view_btn.clicked.connect(lambda checked, d_id=dataset['id']: self.view_dataset(d_id))
+                self.history_table.setCellWidget(row, 3, view_btn)
+            
+            self.log(f"Loaded {len(datasets)} datasets from history")
+        else:
+            self.log(f"Failed to load datasets: {response.text}")
     
     def view_dataset(self, dataset_id):
         self.current_dataset_id = dataset_id
+        self.analysis = None
         self.status_label.setText(f"Viewing Dataset ID: {dataset_id}")
-        self.download_btn.setEnabled(True)
-        self.load_charts()
+        self.status_label.setStyleSheet(STYLES['status_ready'])
+        self.download_btn.setEnabled(False)
+        # charts load from the status answer once the dataset is completed, polling until then
+        self.start_status_polling(delay=0)
         self.tabs.setCurrentIndex(1)
     
     def show_change_password(self):
@@ -342,15 +594,33 @@ class HomePage(QMainWindow):
             QMessageBox.No
         )
         
-        if reply == QMessageBox.Yes:
-            try:
-                if self.refresh_token:
-                    self.api_client.logout(self.refresh_token)
-            except:
-                pass
-            
-            self.close()
-            QApplication.quit()
+        if reply != QMessageBox.Yes:
+            return
+        if not self.refresh_token:
+            self.logout_done()
+            return
+        
+        self.logout_btn.setEnabled(False)
+        self.log("Logging out...")
+        # the window closes either way, a server that can't be reached only keeps the token valid
+        self.tasks.run(
+            'logout', self.api_client.logout, self.refresh_token,
+            on_finished=lambda response: self.logout_done(),
+            on_failed=lambda error: self.logout_done()
+        )
+    
+    def logout_done(self):
+        self.token = None
+        self.refresh_token = None
+        self.api_client.token = None
+        self.close()
+        QApplication.quit()
+    
+    def closeEvent(self, event):
+        # results of calls still running have no window to go to
+        self.stop_status_polling()
+        self.tasks.cancel_all()
+        super().closeEvent(event)
     
     def log(self, message):
         timestamp = format_timestamp()
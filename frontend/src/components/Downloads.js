@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { apiFetch, isAuthenticated } from './apiHelper';
+import { apiFetch, fetchReport, isAuthenticated } from './apiHelper';
 import { API_BASE_URL } from './config';
 import './Downloads.css';
 
@@ -60,9 +60,9 @@ function Downloads({ user, onLogout }) {
 
   const handleDownload = async (datasetId) => {
     try {
-      const response = await apiFetch(`${API_BASE_URL}/api/download-pdf/${datasetId}/`);
+      const response = await fetchReport(`${API_BASE_URL}/api/download-pdf/${datasetId}/`);
 
-      if (response.ok) {
+      if (response.status === 200) {
         const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -74,7 +74,7 @@ function Downloads({ user, onLogout }) {
         document.body.removeChild(a);
       } else {
         const data = await response.json();
-        alert(data.error || 'Download failed');
+        alert(data.error || data.message || 'Download failed');
       }
     } catch (error) {
       console.error('Download error:', error);
@@ -232,7 +232,7 @@ function Downloads({ user, onLogout }) {
                   </div>
 
                   <div className="dataset-actions">
-                    {dataset.status === 'completed' && dataset.pdf_file && (
+                    {dataset.status === 'completed' && (
                       <button 
                         className="download-btn"
                         onClick={() => handleDownload(dataset.id)}
@@ -1,6 +1,6 @@
 import React, { useState, useRef, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { apiFetch, isAuthenticated } from './apiHelper';
+import { apiFetch, fetchReport, isAuthenticated } from './apiHelper';
 import {
   Chart as ChartJS,
   CategoryScale,
@@ -36,9 +36,9 @@ function MainPage({ user, onLogout }) {
   const [currentDatasetId, setCurrentDatasetId] = useState(null);
   const [analysisData, setAnalysisData] = useState(null);
   const [processingStatus, setProcessingStatus] = useState(null);
+  const [processingProgress, setProcessingProgress] = useState(null);
   const fileInputRef = useRef(null);
   const navigate = useNavigate();
-  const pollIntervalRef = useRef(null);
 
   useEffect(() => {
     if (!isAuthenticated()) {
@@ -47,39 +47,67 @@ function MainPage({ user, onLogout }) {
   }, [navigate]);
 
   useEffect(() => {
-    if (currentDatasetId && processingStatus !== 'completed' && processingStatus !== 'failed') {
-      pollIntervalRef.current = setInterval(() => {
-        checkDatasetStatus(currentDatasetId);
-      }, 2000); 
-      return () => {
-        if (pollIntervalRef.current) {
-          clearInterval(pollIntervalRef.current);
-        }
-      };
+    if (!currentDatasetId) {
+      return;
     }
-  }, [currentDatasetId, processingStatus]);
+    const watch = { cancelled: false };
+    watchDatasetStatus(currentDatasetId, watch);
+    return () => {
+      watch.cancelled = true;
+    };
+  }, [currentDatasetId]);
+
+  const watchDatasetStatus = async (datasetId, watch) => {
+    // long-poll: the server holds each request until the status or progress changes. A server
+    // that can't hold requests (WSGI) answers at once with Retry-After, polled with backoff then
+    let version = '';
+    let delay = 0;
+    while (!watch.cancelled) {
+      try {
+        const response = await apiFetch(
+          `http://localhost:8000/api/dataset-status/${datasetId}/stream/?wait=25&since=${version}`
+        );
+        if (watch.cancelled) {
+          return;
+        }
+        if (!response.ok) {
+          if (response.status === 404) {
+            return;
+          }
+          await new Promise((resolve) => setTimeout(resolve, 3000));
+          continue;
+        }
 
-  const checkDatasetStatus = async (datasetId) => {
-    try {
-      const response = await apiFetch(`http://localhost:8000/api/dataset-status/${datasetId}/`);
-      if (response.ok) {
         const data = await response.json();
+        const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+        if (Number.isNaN(retryAfter)) {
+          delay = 0;
+        } else if (data.version !== version) {
+          delay = retryAfter;
+        } else {
+          delay = Math.min(delay * 2, 30);
+        }
+        version = data.version;
         setProcessingStatus(data.status);
-        
-        if (data.status === 'completed' && data.analysis) {
-          setAnalysisData(data.analysis);
-          if (pollIntervalRef.current) {
-            clearInterval(pollIntervalRef.current);
+        setProcessingProgress(data.progress || null);
+
+        if (data.status === 'completed') {
+          if (data.analysis) {
+            setAnalysisData(data.analysis);
           }
-        } else if (data.status === 'failed') {
+          return;
+        }
+        if (data.status === 'failed') {
           setUploadError(data.error || 'Analysis failed. Please check your CSV file and try again.');
-          if (pollIntervalRef.current) {
-            clearInterval(pollIntervalRef.current);
-          }
+          return;
         }
+        if (delay) {
+          await new Promise((resolve) => setTimeout(resolve, delay * 1000));
+        }
+      } catch (error) {
+        console.error('Error checking status:', error);
+        await new Promise((resolve) => setTimeout(resolve, 3000));
       }
-    } catch (error) {
-      console.error('Error checking status:', error);
     }
   };
 
@@ -172,9 +200,6 @@ function MainPage({ user, onLogout }) {
     if (fileInputRef.current) {
       fileInputRef.current.value = '';
     }
-    if (pollIntervalRef.current) {
-      clearInterval(pollIntervalRef.current);
-    }
   };
 
   const handleLogoutClick = async () => {
@@ -201,8 +226,8 @@ function MainPage({ user, onLogout }) {
     if (!currentDatasetId) return;
     
     try {
-      const response = await apiFetch(`http://localhost:8000/api/download-pdf/${currentDatasetId}/`);
-      if (response.ok) {
+      const response = await fetchReport(`http://localhost:8000/api/download-pdf/${currentDatasetId}/`);
+      if (response.status === 200) {
         const blob = await response.blob();
         const url = window.URL.createObjectURL(blob);
         const a = document.createElement('a');
@@ -419,7 +444,10 @@ function MainPage({ user, onLogout }) {
           {processingStatus && processingStatus !== 'completed' && processingStatus !== 'failed' && (
             <div className="processing-message">
               <div className="spinner"></div>
-              <span>Processing your data... Status: {processingStatus}</span>
+              <span>
+                Processing your data... Status: {processingStatus}
+                {processingProgress && ` (${processingProgress.stage}, ${processingProgress.percent}%)`}
+              </span>
             </div>
           )}
 
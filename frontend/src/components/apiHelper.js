@@ -84,6 +84,19 @@ export async function apiFetch(url, options = {}) {
   return response;
 }
 
+// The report download, asked for again while the server answers 202 (built elsewhere right now)
+export async function fetchReport(url, maxAttempts = 60) {
+  for (let attempt = 1; ; attempt++) {
+    const response = await apiFetch(url);
+    if (response.status !== 202 || attempt >= maxAttempts) {
+      return response;
+    }
+    const retryAfter = parseInt(response.headers.get('Retry-After'), 10);
+    const delay = Number.isNaN(retryAfter) ? 5 : retryAfter;
+    await new Promise((resolve) => setTimeout(resolve, delay * 1000));
+  }
+}
+
 export function isAuthenticated() {
   const accessToken = localStorage.getItem('access_token');
   const refreshToken = localStorage.getItem('refresh_token');